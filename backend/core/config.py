@@ -1,3 +1,4 @@
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -9,6 +10,103 @@ class Settings(BaseSettings):
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
 
+    # Shared scraper HTTP client
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = 10
+    HTTP_TIMEOUT: float = 20.0
+
+    # Streaming fetch for price checks: stop downloading once the listing fields are in
+    # (plus some slack), or at the byte budget
+    SCRAPE_STREAM_ENABLED: bool = True
+    SCRAPE_STREAM_BYTE_BUDGET: int = 1_000_000
+    SCRAPE_STREAM_SLACK_BYTES: int = 32_768
+
+    # URLs whose last fetch fingerprint (page hash, ETag/Last-Modified, listing) is kept
+    # so unchanged pages skip parsing on the next check (0 disables)
+    PAGE_FINGERPRINT_CACHE_SIZE: int = 200_000
+
+    # Raw HTML archive: zstd-compressed, content-addressed copies of fetched pages,
+    # for offline re-extraction with reextract_archive.py (unset = disabled)
+    PAGE_ARCHIVE_DIR: Optional[str] = None
+    PAGE_ARCHIVE_LEVEL: int = 6
+
+    # scrape_url result cache (concurrent calls for one listing always share a single fetch)
+    SCRAPE_CACHE_TTL_SECONDS: float = 300.0
+    SCRAPE_CACHE_MAX_ENTRIES: int = 10_000
+
+    # Retries for transient fetch failures (timeouts, network errors, 5xx): exponential
+    # backoff with full jitter, starting at the base delay and capped at the max
+    SCRAPE_RETRY_ATTEMPTS: int = 3
+    SCRAPE_RETRY_BASE_SECONDS: float = 1.0
+    SCRAPE_RETRY_MAX_SECONDS: float = 30.0
+
+    # Per-domain circuit breaker: this many blocked/transient failures in a row pause the
+    # domain for the open period, doubled after every failed probe up to the max
+    SCRAPE_BREAKER_THRESHOLD: int = 5
+    SCRAPE_BREAKER_OPEN_SECONDS: float = 300.0
+    SCRAPE_BREAKER_MAX_OPEN_SECONDS: float = 3600.0
+
+    # POST /scrape: most URLs one request may send, and how many of them are scraped at once
+    SCRAPE_API_MAX_BATCH: int = 100
+    SCRAPE_API_MAX_CONCURRENCY: int = 8
+
+    # Monthly price_history partitions created ahead of time (see db/partitions.py)
+    PRICE_HISTORY_PARTITION_MONTHS_AHEAD: int = 3
+
+    # GET /track/{id}/history: default and largest max_points, and the raw export's page sizes
+    HISTORY_DEFAULT_POINTS: int = 500
+    HISTORY_MAX_POINTS: int = 5000
+    HISTORY_EXPORT_PAGE_SIZE: int = 1000
+    HISTORY_EXPORT_MAX_PAGE_SIZE: int = 10000
+
+    # Bulk tracking jobs (POST /track/bulk): jobs worked on at once, most URLs per job,
+    # scrapes in flight per job, and products saved per transaction
+    TRACK_JOB_WORKERS: int = 2
+    TRACK_JOB_MAX_URLS: int = 5000
+    TRACK_JOB_SCRAPE_CONCURRENCY: int = 8
+    TRACK_JOB_BATCH_SIZE: int = 100
+    # A running job is leased to its process for TRACK_JOB_LEASE_SECONDS and the lease is renewed
+    # as the job saves progress; a job whose process died is resumed by the next one to start after it runs out
+    TRACK_JOB_LEASE_SECONDS: int = 300
+
+    # HTML parser engine used by the scrapers: "html.parser", "lxml" or "lexbor" (see scrapers/engines.py)
+    SCRAPER_PARSER_ENGINE: str = "html.parser"
+    # Worker processes used to parse scraped pages (None = one per CPU core, 0 = parse inline)
+    SCRAPE_PARSE_WORKERS: Optional[int] = None
+
+    # Per-domain limits for the scheduled price check. SCRAPE_DOMAIN_LIMITS overrides
+    # them per domain, e.g. {"www.amazon.in": {"max_in_flight": 4, "requests_per_second": 1.5}}
+    SCRAPE_DOMAIN_MAX_IN_FLIGHT: int = 8
+    SCRAPE_DOMAIN_REQUESTS_PER_SECOND: float = 2.0
+    SCRAPE_DOMAIN_LIMITS: Dict[str, Dict[str, float]] = {}
+
+    # Streaming price-check pipeline (rows claimed per DB round-trip, queue bounds, worker counts)
+    SCHEDULER_READ_BATCH_SIZE: int = 500
+    SCHEDULER_QUEUE_SIZE: int = 1000
+    SCHEDULER_FETCH_WORKERS: int = 32
+    SCHEDULER_WRITE_BATCH_SIZE: int = 200
+    # A partial batch is written once its oldest result has waited this long
+    SCHEDULER_WRITE_FLUSH_SECONDS: float = 5.0
+
+    # Work claiming: any number of scheduler processes split the due products between them.
+    # Claimed rows are leased for SCHEDULER_LEASE_SECONDS (keep it above the time a claimed
+    # batch takes to get through the queues); rows of a worker that died are claimed again
+    # once their lease runs out. Every scheduler process looks for due work each SCHEDULER_POLL_MINUTES.
+    SCHEDULER_LEASE_SECONDS: int = 1800
+    SCHEDULER_POLL_MINUTES: int = 10
+
+    # Adaptive polling (see polling.py): each URL's check interval shrinks with its price
+    # volatility and its number of watchers, scaled so that all URLs together cost about
+    # SCHEDULER_REQUESTS_PER_HOUR, and kept between the min and max interval.
+    SCHEDULER_REQUESTS_PER_HOUR: float = 1000.0
+    SCHEDULER_MIN_CHECK_INTERVAL_HOURS: float = 1.0
+    SCHEDULER_MAX_CHECK_INTERVAL_HOURS: float = 72.0
+    # Weight of the newest check in the volatility average, and the volatility floor so stable products still get checked
+    SCHEDULER_VOLATILITY_ALPHA: float = 0.3
+    SCHEDULER_VOLATILITY_FLOOR: float = 0.05
+
     class Config:
         env_file = ".env"
 
@@ -1,3 +1,12 @@
+import math
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import (
+    DateTime, Float, Integer, Numeric, and_, case, cast, column, delete, func, insert, literal, or_, select, true,
+    tuple_, union_all, update, values,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg, insert as pg_insert
 from sqlalchemy.orm import Session, joinedload
 import schemas
 
@@ -5,6 +14,8 @@ import schemas
 import models.user as user_model
 import models.product as product_model
 import models.price_history as price_history_model
+import models.price_rollup as price_rollup_model
+import models.track_job as track_job_model
 
 
 # --- User CRUD Operations ---
@@ -24,82 +35,548 @@ def create_user(db: Session, user: schemas.UserCreate, hashed_password: str):
 
 # --- Product CRUD Operations ---
 
-def get_product_by_signature(db: Session, signature: str):
-    return db.query(product_model.Product).filter(product_model.Product.signature == signature).first()
+def _product_values(scraped_product: schemas.ProductDetails):
+    return {
+        "signature": scraped_product.signature,
+        "name": scraped_product.name,
+        "brand": scraped_product.brand,
+        "category_path": scraped_product.category_path,
+        "image_urls": [str(url) for url in scraped_product.image_urls],
+        "key_features": scraped_product.key_features,
+        "specifications": scraped_product.specifications,
+    }
 
-def create_product(db: Session, scraped_product: schemas.ProductDetails):
-    db_product = product_model.Product(
-        signature=scraped_product.signature,
-        name=scraped_product.name,
-        brand=scraped_product.brand,
-        category_path=scraped_product.category_path,
-        image_urls=[str(url) for url in scraped_product.image_urls],
-        key_features=scraped_product.key_features,
-        specifications=scraped_product.specifications
+def _listing_values(listing: schemas.ListingDetails):
+    return {
+        "url": str(listing.url),
+        "initial_price": listing.price,
+        "current_price": listing.price,
+        "is_active": True,
+        "mrp": listing.mrp,
+        "currency": listing.currency,
+        "stock_status": listing.stock_status,
+        "seller_name": listing.seller_name,
+        "average_rating": listing.average_rating,
+        "num_ratings": listing.num_ratings,
+        "offers": listing.offers,
+    }
+
+def _upsert_products(product_rows: List[dict]):
+    """
+    INSERT ... ON CONFLICT (signature) for products, returning (signature, id)
+    for every row, whether it was inserted or already there. The no-op
+    DO UPDATE is what makes existing rows show up in RETURNING.
+    """
+    stmt = pg_insert(product_model.Product).values(product_rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[product_model.Product.signature],
+        set_={"signature": stmt.excluded.signature},
+    ).returning(product_model.Product.signature, product_model.Product.id)
+
+def _upsert_listings(listing_rows: List[dict]):
+    """
+    INSERT ... ON CONFLICT (url) for listings, returning (url, id) for every
+    row. The listing row stays locked until the transaction ends, which keeps
+    concurrent _refresh_listing_watchers counts of it in order.
+    """
+    stmt = pg_insert(product_model.Listing).values(listing_rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[product_model.Listing.url],
+        set_={"product_id": stmt.excluded.product_id},
+    ).returning(product_model.Listing.url, product_model.Listing.id)
+
+def _lock_listings(listing_ids: List[int]):
+    """Locks the listings before their subscribers change (see _upsert_listings)."""
+    return (
+        select(product_model.Listing.id)
+        .where(product_model.Listing.id.in_(listing_ids))
+        .order_by(product_model.Listing.id)
+        .with_for_update()
     )
-    db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
-    return db_product
 
-def create_tracked_product_for_user(
-    db: Session, user: user_model.User, product: product_model.Product, listing: schemas.ListingDetails
-):
-    db_tracked_product = product_model.TrackedProduct(
-        url=str(listing.url),
-        initial_price=listing.price,
-        current_price=listing.price,
-        owner_id=user.id,
-        product_id=product.id,
-        mrp=listing.mrp,
-        currency=listing.currency,
-        stock_status=listing.stock_status,
-        seller_name=listing.seller_name,
-        average_rating=listing.average_rating,
-        num_ratings=listing.num_ratings,
-        offers=listing.offers
-    )
-    db.add(db_tracked_product)
+def _refresh_listing_watchers(listing_ids: List[int]):
+    """Recounts the active tracked rows of the given listings into listings.watchers."""
+    listing = product_model.Listing
+    tracked = product_model.TrackedProduct
+    return (
+        update(listing)
+        .where(listing.id.in_(listing_ids))
+        .values(watchers=(
+            select(func.count())
+            .where(tracked.listing_id == listing.id, tracked.is_active == True)
+            .scalar_subquery()
+        ))
+        .execution_options(synchronize_session=False)
+    )
+
+def _upsert_tracked_product(owner_id: int, scraped_product: schemas.ProductDetails):
+    """The single statement behind upsert_tracked_product; returns (id, listing_id) of the tracked product."""
+    product = _upsert_products([_product_values(scraped_product)]).cte("product")
+    product_id = select(product.c.id).scalar_subquery()
+    listing = _upsert_listings([{"url": str(scraped_product.listing.url), "product_id": product_id}]).cte("listing")
+    tracked = _listing_values(scraped_product.listing)
+    stmt = pg_insert(product_model.TrackedProduct).values(
+        **tracked, owner_id=owner_id, product_id=product_id, listing_id=select(listing.c.id).scalar_subquery()
+    )
+    return stmt.on_conflict_do_update(
+        constraint="uq_tracked_products_owner_url",
+        set_={
+            name: stmt.excluded[name]
+            for name in tracked if name not in ("url", "initial_price")
+        } | {"product_id": stmt.excluded.product_id, "listing_id": stmt.excluded.listing_id},
+    ).returning(product_model.TrackedProduct.id, product_model.TrackedProduct.listing_id).add_cte(product).add_cte(listing)
+
+def upsert_tracked_product(db: Session, owner_id: int, scraped_product: schemas.ProductDetails):
+    """
+    Creates or reuses the product (by signature), its shared listing (by URL)
+    and the user's tracking row (by owner and URL) in one statement, so
+    concurrent adds of the same product can't collide. Re-tracking a URL
+    reactivates the row and refreshes its listing details; initial_price is
+    kept. Commits and returns the tracked product id.
+    """
+    tracked_product_id, listing_id = db.execute(_upsert_tracked_product(owner_id, scraped_product)).one()
+    db.execute(_refresh_listing_watchers([listing_id]))
     db.commit()
-    db.refresh(db_tracked_product)
-    return db_tracked_product
+    return tracked_product_id
+
+def _tracked_products_for_user(user_id: int):
+    """The user's tracked products with their product details (read through uq_tracked_products_owner_url)."""
+    return (
+        select(product_model.TrackedProduct)
+        .options(joinedload(product_model.TrackedProduct.product))
+        .where(product_model.TrackedProduct.owner_id == user_id)
+    )
 
 def get_tracked_products_for_user(db: Session, user_id: int):
     """
     Fetches all products a specific user is tracking.
     """
-    # 2. Add .options(joinedload(...)) to the query to eagerly load product details
+    return db.scalars(_tracked_products_for_user(user_id)).all()
+
+def _claim_listings(lease_owner: str, limit: int, now: datetime, lease_seconds: int):
+    """
+    Leases up to `limit` watched listings whose next_check_at has come and that
+    no live worker holds, most overdue first, in one statement: the partial
+    index on next_check_at of watched listings is the scheduler's due-time
+    priority queue. Rows other workers are claiming at the same moment are
+    skipped (FOR UPDATE SKIP LOCKED), so concurrent workers never get the same
+    listing. Returns (id, url, last_price, last_price_since, volatility,
+    last_checked_at, watchers, product_name) rows.
+    """
+    listing = product_model.Listing
+    due = (
+        select(listing.id)
+        .where(
+            listing.watchers > 0,
+            or_(listing.next_check_at.is_(None), listing.next_check_at <= now),
+            or_(listing.lease_expires_at.is_(None), listing.lease_expires_at < func.localtimestamp()),
+        )
+        .order_by(listing.next_check_at.asc().nulls_first())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    claimed = (
+        update(listing)
+        .where(listing.id.in_(due))
+        .values(lease_owner=lease_owner, lease_expires_at=func.localtimestamp() + timedelta(seconds=lease_seconds))
+        .returning(listing.id, listing.url, listing.last_price, listing.last_price_since, listing.volatility,
+                   listing.last_checked_at, listing.watchers, listing.product_id)
+        .cte("claimed")
+    )
     return (
-        db.query(product_model.TrackedProduct)
-        .options(joinedload(product_model.TrackedProduct.product))
-        .filter(product_model.TrackedProduct.owner_id == user_id)
-        .all()
+        select(
+            claimed.c.id, claimed.c.url, claimed.c.last_price, claimed.c.last_price_since, claimed.c.volatility,
+            claimed.c.last_checked_at, claimed.c.watchers, product_model.Product.name.label("product_name"),
+        )
+        .outerjoin(product_model.Product, claimed.c.product_id == product_model.Product.id)
+        .order_by(claimed.c.id)
     )
 
-def get_all_active_tracked_products(db: Session):
-    """Fetches all tracked products that are currently active."""
-    # FIXED: Use the 'product_model' alias
-    return db.query(product_model.TrackedProduct).filter(product_model.TrackedProduct.is_active == True).all()
+def _release_listings(
+    checked: List[Tuple[int, datetime, datetime, float, Optional[float], Optional[datetime]]], lease_owner: str
+):
+    """
+    Records (listing_id, checked_at, next_check_at, volatility, last_price,
+    last_price_since) check outcomes and gives up the worker's lease on those listings.
+    """
+    done = values(
+        column("id", Integer), column("checked_at", DateTime), column("next_check_at", DateTime),
+        column("volatility", Float), column("last_price", Numeric(10, 2)), column("last_price_since", DateTime),
+        name="done",
+    ).data(checked)
+    listing = product_model.Listing
+    return (
+        update(listing)
+        # A lease that ran out may already belong to another worker; leave those rows alone
+        .where(listing.id == done.c.id, listing.lease_owner == lease_owner)
+        .values(
+            last_checked_at=done.c.checked_at,
+            next_check_at=done.c.next_check_at,
+            volatility=done.c.volatility,
+            last_price=done.c.last_price,
+            last_price_since=done.c.last_price_since,
+            lease_owner=None,
+            lease_expires_at=None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+def _polling_weight_total(volatility_floor: float):
+    """sum(weight) over every watched listing; see polling.py for the formula."""
+    listing = product_model.Listing
+    return select(func.sum(
+        (listing.volatility + volatility_floor) * (1 + func.ln(listing.watchers) / math.log(2))
+    )).where(listing.watchers > 0)
+
+def _price_history_rows(results: Iterable[Tuple[int, float, datetime, datetime]]):
+    """One history row per (listing_id, price, checked_at, run_started_at) check; see _upsert_price_history."""
+    return [
+        {
+            "listing_id": listing_id, "price": price,
+            "timestamp": run_started_at, "last_seen": checked_at, "checks": 1,
+        }
+        for listing_id, price, checked_at, run_started_at in results
+    ]
+
+def _price_check_points(results: Iterable[Tuple[int, float, datetime, datetime]]):
+    """The (listing_id, price, checked_at) points of history results, as the rollups take them."""
+    return [(listing_id, price, checked_at) for listing_id, price, checked_at, _ in results]
+
+def _upsert_price_history(rows: List[dict]):
+    """
+    Price history is stored run-length encoded: a row is a run of one price,
+    first seen at `timestamp` and last seen at `last_seen`, over `checks` checks.
+    A check that changes the price starts a run (run_started_at = checked_at)
+    and inserts a row; a check at the same price names the current run's start
+    and only extends it, through ON CONFLICT on (listing_id, timestamp).
+    """
+    ph = price_history_model.PriceHistory
+    stmt = pg_insert(ph).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[ph.listing_id, ph.timestamp],
+        set_={
+            "last_seen": func.greatest(ph.last_seen, stmt.excluded.last_seen),
+            "checks": ph.checks + stmt.excluded.checks,
+        },
+    )
+
+def _compact_price_history(listing_ids: List[int]):
+    """
+    Merges consecutive runs of the same price of the given listings into one
+    (the earliest row, with the latest last_seen and the checks added up), e.g.
+    after points were backfilled into the history.
+    """
+    ph = price_history_model.PriceHistory
+    order = (ph.timestamp, ph.id)
+    ordered = (
+        select(
+            ph.id, ph.timestamp, ph.listing_id, ph.last_seen, ph.checks,
+            case(
+                (func.lag(ph.price).over(partition_by=ph.listing_id, order_by=order).is_distinct_from(ph.price), 1),
+                else_=0,
+            ).label("starts_run"),
+        )
+        .where(ph.listing_id.in_(listing_ids))
+        .subquery()
+    )
+    numbered = select(
+        ordered,
+        func.sum(ordered.c.starts_run).over(
+            partition_by=ordered.c.listing_id, order_by=(ordered.c.timestamp, ordered.c.id)
+        ).label("run"),
+    ).cte("numbered")
+    runs = (
+        select(
+            numbered.c.listing_id, numbered.c.run,
+            func.min(numbered.c.timestamp).label("first_seen"),
+            func.max(numbered.c.last_seen).label("last_seen"),
+            func.sum(numbered.c.checks).label("checks"),
+        )
+        .group_by(numbered.c.listing_id, numbered.c.run)
+        .having(func.count() > 1)
+        .cte("runs")
+    )
+    merged = (
+        update(ph)
+        .where(ph.listing_id == runs.c.listing_id, ph.timestamp == runs.c.first_seen)
+        .values(last_seen=runs.c.last_seen, checks=runs.c.checks)
+        .returning(ph.id)
+        .cte("merged")
+    )
+    return (
+        delete(ph)
+        .where(
+            ph.id == numbered.c.id, ph.timestamp == numbered.c.timestamp,
+            numbered.c.listing_id == runs.c.listing_id, numbered.c.run == runs.c.run,
+            numbered.c.timestamp > runs.c.first_seen,
+        )
+        .add_cte(merged)
+        .execution_options(synchronize_session=False)
+    )
+
+def _price_history_range(listing_id: int, start: Optional[datetime], end: Optional[datetime]):
+    """The listing's runs that overlap [start, end]."""
+    ph = price_history_model.PriceHistory
+    conditions = [ph.listing_id == listing_id]
+    if start is not None:
+        conditions.append(ph.last_seen >= start)
+    if end is not None:
+        conditions.append(ph.timestamp <= end)
+    return conditions
+
+def _price_history_points(listing_id: int, start: Optional[datetime], end: Optional[datetime]):
+    """
+    The runs overlapping [start, end] expanded into (price, timestamp) points:
+    each run is seen at its start and, if later, at its end, both clipped to
+    the range. Joining the points gives the step line of the price over time.
+    """
+    ph = price_history_model.PriceHistory
+    in_range = _price_history_range(listing_id, start, end)
+    first_seen = ph.timestamp if start is None else func.greatest(ph.timestamp, start)
+    last_seen = ph.last_seen if end is None else func.least(ph.last_seen, end)
+    return union_all(
+        select(ph.price, first_seen.label("timestamp")).where(*in_range),
+        select(ph.price, last_seen).where(*in_range, last_seen > first_seen),
+    ).subquery("points")
+
+def _min_max_buckets(points, max_points: int):
+    """
+    Min/max bucketing in SQL: if the (price, timestamp) `points` don't fit in
+    `max_points`, they are cut into equal time buckets, and only the lowest and
+    highest price of each bucket are returned, plus the first and last point.
+    Peaks and dips survive, so the chart keeps its shape, and at most
+    `max_points` rows leave the database however many points there are.
+    """
+    # Referenced twice below, so it is materialized once as a CTE
+    points = select(points).cte("points")
+    buckets = max(max_points // 2 - 1, 1)
+    epoch = func.extract("epoch", points.c.timestamp)
+    bounds = (
+        select(
+            func.min(points.c.timestamp).label("first"), func.max(points.c.timestamp).label("last"),
+            func.min(epoch).label("lo"), func.max(epoch).label("hi"),
+        )
+        .cte("bounds")
+    )
+    width = func.greatest((bounds.c.hi - bounds.c.lo) / buckets, 1)
+    bucket = func.least(func.floor((epoch - bounds.c.lo) / width), buckets - 1)
+    ranked = (
+        select(
+            points.c.timestamp, points.c.price,
+            func.row_number().over(partition_by=bucket, order_by=(points.c.price, points.c.timestamp)).label("lowest"),
+            func.row_number().over(partition_by=bucket, order_by=(points.c.price.desc(), points.c.timestamp)).label("highest"),
+            or_(points.c.timestamp == bounds.c.first, points.c.timestamp == bounds.c.last).label("edge"),
+            func.count().over().label("total"),
+        )
+        .select_from(points.join(bounds, true()))
+        .subquery()
+    )
+    return (
+        select(ranked.c.price, ranked.c.timestamp)
+        .where(or_(ranked.c.total <= max_points, ranked.c.lowest == 1, ranked.c.highest == 1, ranked.c.edge))
+        .order_by(ranked.c.timestamp)
+        .limit(max_points)
+    )
 
-def add_price_history_record(db: Session, tracked_product_id: int, price: float):
-    """Adds a new price entry to the history table."""
-    # FIXED: Use the 'price_history_model' alias
-    db_price_history = price_history_model.PriceHistory(
-        tracked_product_id=tracked_product_id,
-        price=price
+def _downsampled_price_history(listing_id: int, start: Optional[datetime], end: Optional[datetime], max_points: int):
+    """
+    The history's points in the [start, end] range (default: the whole history;
+    see _price_history_points), downsampled by _min_max_buckets.
+    """
+    return _min_max_buckets(_price_history_points(listing_id, start, end).alias("points"), max_points)
+
+def _price_history_page(
+    listing_id: int,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    after: Optional[Tuple[datetime, int]],
+    limit: int,
+):
+    """
+    One page of raw price history runs overlapping [start, end] in (timestamp, id)
+    order, for export. `after` is the (timestamp, id) of the previous page's last
+    row: keyset pagination, so every page costs the same however deep into the
+    history it is.
+    """
+    ph = price_history_model.PriceHistory
+    conditions = _price_history_range(listing_id, start, end)
+    if after is not None:
+        conditions.append(tuple_(ph.timestamp, ph.id) > tuple_(*after))
+    return (
+        select(ph.id, ph.price, ph.timestamp, ph.last_seen, ph.checks)
+        .where(*conditions)
+        .order_by(ph.timestamp, ph.id)
+        .limit(limit)
+    )
+
+def bulk_add_price_history(db: Session, results: Iterable[Tuple[int, float, datetime, datetime]]):
+    """
+    Records many (listing_id, price, checked_at, run_started_at) checks
+    in one statement (see _upsert_price_history). Does not commit; see save_price_checks.
+    """
+    rows = _price_history_rows(results)
+    if rows:
+        db.execute(_upsert_price_history(rows))
+
+def _apply_price_drops(prices: List[Tuple[int, float]]):
+    """
+    Lowers current_price to the checked price on every active tracked row of
+    the (listing_id, price) listings that it is a drop for, in one
+    UPDATE ... FROM (VALUES ...). Returns (id, owner_id, listing_id, old_price,
+    new_price) for each row that dropped; `previous` is read before the update.
+    """
+    new_prices = values(
+        column("listing_id", Integer), column("price", Numeric(10, 2)), name="new_prices"
+    ).data(prices)
+    tracked = product_model.TrackedProduct
+    previous = tracked.__table__.alias("previous")
+    return (
+        update(tracked)
+        .where(
+            tracked.listing_id == new_prices.c.listing_id,
+            tracked.is_active == True,
+            or_(tracked.current_price.is_(None), tracked.current_price > new_prices.c.price),
+            previous.c.id == tracked.id,
+        )
+        .values(current_price=new_prices.c.price)
+        .returning(tracked.id, tracked.owner_id, tracked.listing_id,
+                   previous.c.current_price.label("old_price"), tracked.current_price.label("new_price"))
+        .execution_options(synchronize_session=False)
     )
-    db.add(db_price_history)
+
+def save_price_checks(
+    db: Session,
+    results: Iterable[Tuple[int, float, datetime, datetime]],
+    checked: Iterable[Tuple[int, datetime, datetime, float, Optional[float], Optional[datetime]]] = (),
+    lease_owner: Optional[str] = None,
+):
+    """
+    Writes one batch of listing price checks in a single transaction: every
+    (listing_id, price, checked_at, run_started_at) result, into the listing's
+    history (see _upsert_price_history) and hourly/daily/monthly rollups and as
+    a price drop for its subscribers (see _apply_price_drops), and, for every
+    check in `checked` (failed ones too), its scheduling outcome plus the
+    release of lease_owner's lease (see _release_listings). Returns the price drops.
+    """
+    results = list(results)
+    drops = []
+    if results:
+        bulk_add_price_history(db, results)
+        db.execute(_upsert_price_rollups(_price_rollup_rows(_price_check_points(results))))
+        drops = db.execute(_apply_price_drops([(listing_id, price) for listing_id, price, _, _ in results])).all()
+    checked = list(checked)
+    if checked:
+        db.execute(_release_listings(checked, lease_owner))
     db.commit()
-    return db_price_history
+    return drops
 
-def update_tracked_product_price(db: Session, tracked_product_id: int, new_price: float):
-    """Updates the 'current_price' on the main tracked product record."""
-    # FIXED: Use the 'product_model' alias
-    db_tracked_product = db.query(product_model.TrackedProduct).filter(product_model.TrackedProduct.id == tracked_product_id).first()
-    if db_tracked_product:
-        db_tracked_product.current_price = new_price
-        db.commit()
-    return db_tracked_product
+def _split_price_run(run: Tuple[float, datetime, datetime, int], price: float, at: datetime):
+    """
+    Splits a (price, timestamp, last_seen, checks) run around a check at `at`
+    that saw a different price, returning the runs that replace it. Only a run's
+    first and last checks are stored, so the ones in between are taken to be
+    evenly spaced (as in _rebuild_price_rollups): the check nearest `at` becomes
+    a one-check run of its own, and the checks either side keep the old price.
+    A run with no check in between to spare gets `at` as one more check.
+    """
+    run_price, start, end, checks = run
+    if start == end:
+        return [(price, start, end, checks)]
+    checks = max(checks, 2)
+    step = (end - start) / (checks - 1)
+    if at == start:
+        k = 0
+    elif at == end:
+        k = checks - 1
+    elif checks > 2:
+        k = min(max(round((at - start) / step), 1), checks - 2)
+    else:
+        return [(run_price, start, start, 1), (price, at, at, 1), (run_price, end, end, 1)]
+    runs = []
+    if k > 0:
+        runs.append((run_price, start, start + (k - 1) * step, k))
+    runs.append((price, at, at, 1))
+    if k < checks - 1:
+        runs.append((run_price, start + (k + 1) * step, end, checks - k - 1))
+    return runs
+
+def replace_price_history(db: Session, results: Iterable[Tuple[int, float, datetime]]):
+    """
+    Backfill helper: applies re-extracted (listing_id, price, timestamp) checks
+    to the history, in one transaction. A check inside a run of the same price
+    is already counted there; one that saw another price is split out of its
+    run (see _split_price_run); one outside every run is added as a one-check
+    run. Runs of the same price that end up next to each other are merged.
+    """
+    points = {}
+    for listing_id, price, timestamp in results:
+        points.setdefault(listing_id, []).append((timestamp, price))
+    if not points:
+        return
+    ph = price_history_model.PriceHistory
+    ranges = values(
+        column("listing_id", Integer), column("first", DateTime), column("last", DateTime), name="ranges"
+    ).data([
+        (listing_id, min(listing_points)[0], max(listing_points)[0]) for listing_id, listing_points in points.items()
+    ])
+    runs = {}
+    for row in db.execute(
+        select(ph.id, ph.listing_id, ph.price, ph.timestamp, ph.last_seen, ph.checks)
+        .where(ph.listing_id == ranges.c.listing_id, ph.last_seen >= ranges.c.first, ph.timestamp <= ranges.c.last)
+        .order_by(ph.listing_id, ph.timestamp)
+    ):
+        runs.setdefault(row.listing_id, []).append([(row.price, row.timestamp, row.last_seen, row.checks), row.id])
+
+    replaced = [] # (id, timestamp) of stored runs that were split
+    added = []
+    for listing_id, listing_points in points.items():
+        listing_runs = runs.get(listing_id, [])
+        for timestamp, price in sorted(listing_points):
+            index = bisect_right([run[1] for run, _ in listing_runs], timestamp) - 1
+            if index >= 0 and listing_runs[index][0][2] >= timestamp:
+                run, run_id = listing_runs[index]
+                if float(run[0]) == float(price):
+                    continue
+                if run_id is not None:
+                    replaced.append((run_id, run[1]))
+                listing_runs[index:index + 1] = [[split, None] for split in _split_price_run(run, price, timestamp)]
+            else:
+                listing_runs.insert(index + 1, [(price, timestamp, timestamp, 1), None])
+        added.extend(
+            {"listing_id": listing_id, "price": price, "timestamp": start, "last_seen": end, "checks": checks}
+            for (price, start, end, checks), run_id in listing_runs if run_id is None
+        )
+
+    if replaced:
+        db.execute(delete(ph).where(tuple_(ph.id, ph.timestamp).in_(replaced)).execution_options(synchronize_session=False))
+    if added:
+        db.execute(insert(ph).values(added))
+    db.execute(_compact_price_history(sorted(points)))
+    db.commit()
+
+def get_all_listing_links(db: Session):
+    """(id, url, product_id) for every listing, watched or not."""
+    return db.query(
+        product_model.Listing.id,
+        product_model.Listing.url,
+        product_model.Listing.product_id,
+    ).all()
+
+def update_product_details(db: Session, product_id: int, scraped_product: schemas.ProductDetails):
+    """Overwrites a product's canonical details with a fresh extraction (the signature is kept). Does not commit."""
+    db.execute(
+        update(product_model.Product)
+        .where(product_model.Product.id == product_id)
+        .values(
+            name=scraped_product.name,
+            brand=scraped_product.brand,
+            category_path=scraped_product.category_path,
+            image_urls=[str(url) for url in scraped_product.image_urls],
+            key_features=scraped_product.key_features,
+            specifications=scraped_product.specifications,
+        )
+        .execution_options(synchronize_session=False)
+    )
 
 def get_tracked_product_by_id(db: Session, tracked_product_id: int, user_id: int):
     """Fetches a single tracked product by its ID, ensuring it belongs to the user."""
@@ -110,10 +587,389 @@ def get_tracked_product_by_id(db: Session, tracked_product_id: int, user_id: int
     ).first()
 
 def delete_tracked_product(db: Session, tracked_product_id: int, user_id: int):
-    """Deletes a tracked product record if it exists and belongs to the user."""
+    """
+    Deletes a tracked product record if it exists and belongs to the user. The
+    listing and its price history stay, for the other subscribers and for
+    anyone who tracks the URL again.
+    """
     db_tracked_product = get_tracked_product_by_id(db, tracked_product_id=tracked_product_id, user_id=user_id)
     if db_tracked_product:
+        db.execute(_lock_listings([db_tracked_product.listing_id]))
         db.delete(db_tracked_product)
+        db.flush()
+        db.execute(_refresh_listing_watchers([db_tracked_product.listing_id]))
         db.commit()
         return db_tracked_product
-    return None
\ No newline at end of file
+    return None
+
+
+# --- Price Rollup Operations ---
+
+# Rollup bucket sizes, finest first, with the longest a bucket of each can span
+ROLLUP_GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1), "month": timedelta(days=31)}
+
+def _bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Python version of date_trunc(granularity, timestamp)."""
+    timestamp = timestamp.replace(minute=0, second=0, microsecond=0)
+    if granularity in ("day", "month"):
+        timestamp = timestamp.replace(hour=0)
+    if granularity == "month":
+        timestamp = timestamp.replace(day=1)
+    return timestamp
+
+def _price_rollup_rows(results: Iterable[Tuple[int, float, datetime]]):
+    """Folds (listing_id, price, timestamp) results into one rollup row per listing, granularity and bucket."""
+    rows = {}
+    for listing_id, price, timestamp in results:
+        for granularity in ROLLUP_GRANULARITIES:
+            key = (listing_id, granularity, _bucket_start(timestamp, granularity))
+            row = rows.get(key)
+            if row is None:
+                rows[key] = {
+                    "listing_id": listing_id, "granularity": granularity, "bucket_start": key[2],
+                    "open_price": price, "open_at": timestamp, "close_price": price, "close_at": timestamp,
+                    "min_price": price, "min_at": timestamp, "max_price": price, "max_at": timestamp,
+                    "price_sum": price, "price_count": 1,
+                }
+                continue
+            if timestamp < row["open_at"]:
+                row["open_price"], row["open_at"] = price, timestamp
+            if timestamp >= row["close_at"]:
+                row["close_price"], row["close_at"] = price, timestamp
+            # Ties go to the earliest point, as in _rebuild_price_rollups
+            if (price, timestamp) < (row["min_price"], row["min_at"]):
+                row["min_price"], row["min_at"] = price, timestamp
+            if (-price, timestamp) < (-row["max_price"], row["max_at"]):
+                row["max_price"], row["max_at"] = price, timestamp
+            row["price_sum"] += price
+            row["price_count"] += 1
+    return list(rows.values())
+
+def _upsert_price_rollups(rows: List[dict]):
+    """
+    Merges pre-aggregated rows into price_rollups with INSERT ... ON CONFLICT:
+    open/close keep the earliest/latest point, min/max the extremes, and the
+    sum and count add up. Merging is order-independent, so late or replayed
+    batches land in the right place.
+    """
+    rollup = price_rollup_model.PriceRollup
+    stmt = pg_insert(rollup).values(rows)
+    new = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[rollup.listing_id, rollup.granularity, rollup.bucket_start],
+        set_={
+            "open_price": case((new.open_at < rollup.open_at, new.open_price), else_=rollup.open_price),
+            "open_at": func.least(rollup.open_at, new.open_at),
+            "close_price": case((new.close_at >= rollup.close_at, new.close_price), else_=rollup.close_price),
+            "close_at": func.greatest(rollup.close_at, new.close_at),
+            "min_price": func.least(rollup.min_price, new.min_price),
+            "min_at": case((tuple_(new.min_price, new.min_at) < tuple_(rollup.min_price, rollup.min_at), new.min_at), else_=rollup.min_at),
+            "max_price": func.greatest(rollup.max_price, new.max_price),
+            "max_at": case(
+                (or_(new.max_price > rollup.max_price, and_(new.max_price == rollup.max_price, new.max_at < rollup.max_at)), new.max_at),
+                else_=rollup.max_at,
+            ),
+            "price_sum": rollup.price_sum + new.price_sum,
+            "price_count": rollup.price_count + new.price_count,
+        },
+    )
+
+def _first(value, *order_by):
+    """The `value` of the first row in `order_by` order within the group."""
+    return array_agg(aggregate_order_by(value, *order_by))[1]
+
+def _rebuild_price_rollups(granularity: str, listing_ids: List[int]):
+    """
+    INSERT ... SELECT that recomputes one granularity's rollups for the given
+    listings: hours from the raw price_history, days from the hours and months
+    from the days, so each level only reads the much smaller one below it.
+
+    The history only keeps when each run of a price was first and last seen, so
+    the checks in between are taken to be evenly spaced, and every hour a run
+    spans gets the checks that fall into it.
+    """
+    rollup = price_rollup_model.PriceRollup
+    ph = price_history_model.PriceHistory
+    if granularity == "hour":
+        hour = timedelta(hours=1)
+        second = literal(timedelta(seconds=1))
+        # Functions in FROM see the columns before them, so each run gets its own hours
+        bucket = func.generate_series(
+            func.date_trunc("hour", ph.timestamp), func.date_trunc("hour", ph.last_seen), hour
+        ).table_valued("bucket", joins_implicitly=True).render_derived("buckets").c.bucket
+        last = ph.checks - 1
+        # Seconds between checks; NULL when they were all at one instant
+        step = func.nullif(func.extract("epoch", ph.last_seen - ph.timestamp), 0) / func.greatest(last, 1)
+
+        def checks_before(at):
+            return func.ceil(func.extract("epoch", at - ph.timestamp) / step)
+
+        # Checks first..last_in (counted from 0) of each run fall into each hour; greatest/least skip NULLs
+        spread = (
+            select(
+                ph.listing_id, ph.price, ph.timestamp, ph.last_seen, last.label("last"), step.label("step"),
+                bucket.label("bucket_start"),
+                func.greatest(checks_before(bucket), 0).label("first"),
+                func.least(checks_before(bucket + hour) - 1, last).label("last_in"),
+            )
+            .where(ph.listing_id.in_(listing_ids))
+            .subquery()
+        )
+
+        def check_at(index):
+            return case(
+                (index == spread.c.last, spread.c.last_seen),
+                else_=spread.c.timestamp + func.coalesce(index * spread.c.step, 0) * second,
+            )
+
+        open_at, close_at = check_at(spread.c.first), check_at(spread.c.last_in)
+        count = cast(spread.c.last_in - spread.c.first + 1, Integer)
+        source = (
+            select(
+                spread.c.listing_id, spread.c.bucket_start,
+                spread.c.price.label("open_price"), open_at.label("open_at"),
+                spread.c.price.label("close_price"), close_at.label("close_at"),
+                spread.c.price.label("min_price"), open_at.label("min_at"),
+                spread.c.price.label("max_price"), open_at.label("max_at"),
+                (spread.c.price * count).label("price_sum"), count.label("price_count"),
+            )
+            .where(spread.c.last_in >= spread.c.first)
+            .subquery()
+        )
+    else:
+        finer = list(ROLLUP_GRANULARITIES)[list(ROLLUP_GRANULARITIES).index(granularity) - 1]
+        source = (
+            select(rollup)
+            .where(rollup.listing_id.in_(listing_ids), rollup.granularity == finer)
+            .subquery()
+        )
+    bucket_start = func.date_trunc(granularity, source.c.bucket_start)
+    aggregated = (
+        select(
+            source.c.listing_id,
+            literal(granularity),
+            bucket_start,
+            _first(source.c.open_price, source.c.open_at), func.min(source.c.open_at),
+            _first(source.c.close_price, source.c.close_at.desc()), func.max(source.c.close_at),
+            func.min(source.c.min_price), _first(source.c.min_at, source.c.min_price, source.c.min_at),
+            func.max(source.c.max_price), _first(source.c.max_at, source.c.max_price.desc(), source.c.max_at),
+            func.sum(source.c.price_sum), func.sum(source.c.price_count),
+        )
+        .group_by(source.c.listing_id, bucket_start)
+    )
+    return insert(rollup).from_select(
+        [
+            "listing_id", "granularity", "bucket_start",
+            "open_price", "open_at", "close_price", "close_at", "min_price", "min_at", "max_price", "max_at",
+            "price_sum", "price_count",
+        ],
+        aggregated,
+    )
+
+def rebuild_price_rollups(db: Session, listing_ids: List[int]):
+    """Recomputes every rollup of the given listings from price_history, in one transaction."""
+    db.execute(
+        delete(price_rollup_model.PriceRollup)
+        .where(price_rollup_model.PriceRollup.listing_id.in_(listing_ids))
+    )
+    for granularity in ROLLUP_GRANULARITIES:
+        db.execute(_rebuild_price_rollups(granularity, listing_ids))
+    db.commit()
+
+def get_listing_ids_page(db: Session, after_id: int, limit: int):
+    """Ids of listings (watched or not) after `after_id`, in id order."""
+    return db.scalars(
+        select(product_model.Listing.id)
+        .where(product_model.Listing.id > after_id)
+        .order_by(product_model.Listing.id)
+        .limit(limit)
+    ).all()
+
+def _rollup_granularity(span: timedelta, buckets: int) -> str:
+    """The finest rollup granularity that covers `span` in at most `buckets` buckets (else the coarsest)."""
+    for granularity, size in ROLLUP_GRANULARITIES.items():
+        if span <= size * buckets:
+            return granularity
+    return granularity
+
+def _price_rollup_bounds(listing_id: int):
+    """(first, last) price history timestamps, read from the listing's few monthly rollups."""
+    rollup = price_rollup_model.PriceRollup
+    return select(func.min(rollup.open_at), func.max(rollup.close_at)).where(
+        rollup.listing_id == listing_id, rollup.granularity == "month"
+    )
+
+def _price_rollups_in_range(listing_id: int, granularity: str, start: Optional[datetime], end: Optional[datetime]):
+    rollup = price_rollup_model.PriceRollup
+    conditions = [rollup.listing_id == listing_id, rollup.granularity == granularity]
+    if start is not None:
+        conditions.append(rollup.bucket_start >= func.date_trunc(granularity, start))
+    if end is not None:
+        conditions.append(rollup.bucket_start <= end)
+    return conditions
+
+def _price_rollups(listing_id: int, granularity: str, start: Optional[datetime], end: Optional[datetime], limit: int):
+    """Rollup rows (with avg_price) for the buckets overlapping [start, end], oldest first."""
+    rollup = price_rollup_model.PriceRollup
+    return (
+        select(
+            rollup.bucket_start, rollup.open_price, rollup.close_price, rollup.min_price, rollup.max_price,
+            (rollup.price_sum / rollup.price_count).label("avg_price"), rollup.price_count,
+        )
+        .where(*_price_rollups_in_range(listing_id, granularity, start, end))
+        .order_by(rollup.bucket_start)
+        .limit(limit)
+    )
+
+def _rollup_price_history(listing_id: int, granularity: str, start: Optional[datetime], end: Optional[datetime], max_points: int):
+    """
+    Min/max bucketing read from the rollups instead of raw rows: each bucket's
+    lowest and highest price, at the time they were seen. Ranges with more
+    buckets than fit in `max_points` (only possible at the coarsest granularity)
+    are bucketed further by _min_max_buckets rather than cut short.
+    """
+    rollup = price_rollup_model.PriceRollup
+    in_range = _price_rollups_in_range(listing_id, granularity, start, end)
+    lows = select(rollup.min_price.label("price"), rollup.min_at.label("timestamp")).where(*in_range)
+    highs = select(rollup.max_price, rollup.max_at).where(*in_range, rollup.max_at != rollup.min_at)
+    points = union_all(lows, highs).subquery()
+    conditions = []
+    if start is not None:
+        conditions.append(points.c.timestamp >= start)
+    if end is not None:
+        conditions.append(points.c.timestamp <= end)
+    return _min_max_buckets(
+        select(points.c.price, points.c.timestamp).where(*conditions).subquery("rollup_points"), max_points
+    )
+
+
+# --- Bulk Tracking Job Operations ---
+
+def _new_track_job(owner_id: int, urls: List[str], errors: List[dict]):
+    errors = list(errors)
+    return track_job_model.TrackJob(
+        owner_id=owner_id,
+        status="queued",
+        urls=urls,
+        total=len(urls) + len(errors),
+        processed=len(errors),
+        succeeded=0,
+        skipped=0,
+        failed=len(errors),
+        errors=errors,
+    )
+
+def create_track_job(db: Session, owner_id: int, urls: List[str], errors: List[dict] = ()):
+    """
+    Queues a bulk tracking job for `urls`. Entries already rejected up front (e.g.
+    unparseable CSV rows) are passed as `errors` and count as processed and failed.
+    """
+    db_job = _new_track_job(owner_id, urls, errors)
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+def get_track_job(db: Session, job_id: int, user_id: int):
+    """Fetches a bulk tracking job, ensuring it belongs to the user."""
+    return db.query(track_job_model.TrackJob).filter(
+        track_job_model.TrackJob.id == job_id,
+        track_job_model.TrackJob.owner_id == user_id
+    ).first()
+
+def _track_job_claimable():
+    """Jobs no worker is running: queued, or running under a lease that ran out."""
+    job = track_job_model.TrackJob
+    return or_(
+        job.status == "queued",
+        and_(
+            job.status == "running",
+            or_(job.lease_expires_at.is_(None), job.lease_expires_at < func.localtimestamp()),
+        ),
+    )
+
+def get_unfinished_track_job_ids(db: Session):
+    """Ids of the jobs no worker is running (see _track_job_claimable), oldest first."""
+    return [
+        job_id for (job_id,) in db.query(track_job_model.TrackJob.id)
+        .filter(_track_job_claimable())
+        .order_by(track_job_model.TrackJob.id)
+    ]
+
+def _claim_track_job(job_id: int, lease_owner: str, lease_seconds: int):
+    """
+    Marks a job as running under `lease_owner`'s lease, in one statement, if no
+    worker is running it; of several processes claiming the same job at once,
+    only one gets it. Returns (owner_id, urls, errors, total), or no row when the
+    job is finished or another worker holds it.
+    """
+    job = track_job_model.TrackJob
+    return (
+        update(job)
+        .where(job.id == job_id, _track_job_claimable())
+        .values(
+            status="running",
+            started_at=func.localtimestamp(),
+            lease_owner=lease_owner,
+            lease_expires_at=func.localtimestamp() + timedelta(seconds=lease_seconds),
+        )
+        .returning(job.owner_id, job.urls, job.errors, job.total)
+    )
+
+def _update_track_job(job_id: int, lease_owner: Optional[str], fields: dict):
+    job = track_job_model.TrackJob
+    statement = update(job).where(job.id == job_id)
+    if lease_owner is not None:
+        statement = statement.where(job.lease_owner == lease_owner)
+    return statement.values(**fields).execution_options(synchronize_session=False)
+
+def update_track_job(db: Session, job_id: int, lease_owner: Optional[str] = None, **fields):
+    """
+    Sets the given columns (status, counters, errors, ...) on a job; with `lease_owner`,
+    only while that worker still holds the job. Returns whether the job was updated.
+    Does not commit.
+    """
+    return db.execute(_update_track_job(job_id, lease_owner, fields)).rowcount > 0
+
+def get_tracked_urls_for_user(db: Session, user_id: int):
+    """Every URL the user already tracks."""
+    return [
+        url for (url,) in db.query(product_model.TrackedProduct.url)
+        .filter(product_model.TrackedProduct.owner_id == user_id)
+    ]
+
+def _listing_rows(scraped_products: List[schemas.ProductDetails], product_ids: dict):
+    # ON CONFLICT can't touch the same row twice in one statement, so each URL goes in once
+    # and in URL order, so concurrent jobs lock shared listings in the same order
+    rows = {str(p.listing.url): {"url": str(p.listing.url), "product_id": product_ids[p.signature]} for p in scraped_products}
+    return [rows[url] for url in sorted(rows)]
+
+def _insert_tracked_listings(
+    owner_id: int, scraped_products: List[schemas.ProductDetails], product_ids: dict, listing_ids: dict
+):
+    """Multi-row tracked_products insert that skips URLs the user already tracks."""
+    stmt = pg_insert(product_model.TrackedProduct).values([
+        _listing_values(p.listing) | {
+            "owner_id": owner_id,
+            "product_id": product_ids[p.signature],
+            "listing_id": listing_ids[str(p.listing.url)],
+        }
+        for p in scraped_products
+    ])
+    return stmt.on_conflict_do_nothing(constraint="uq_tracked_products_owner_url")
+
+def bulk_track_products(db: Session, owner_id: int, scraped_products: List[schemas.ProductDetails]):
+    """
+    Tracks many scraped products for one user with a few multi-row statements:
+    a product upsert on signature, a listing upsert on URL, a tracked_products
+    insert that skips URLs the user already tracks, and the listings' watcher
+    counts. Safe against concurrent adds of the same products. Does not commit.
+    """
+    if not scraped_products:
+        return
+    # ON CONFLICT can't touch the same row twice in one statement, so each signature goes in once
+    product_rows = {p.signature: _product_values(p) for p in scraped_products}
+    product_ids = dict(db.execute(_upsert_products(list(product_rows.values()))).tuples().all())
+    listing_ids = dict(db.execute(_upsert_listings(_listing_rows(scraped_products, product_ids))).tuples().all())
+    db.execute(_insert_tracked_listings(owner_id, scraped_products, product_ids, listing_ids))
+    db.execute(_refresh_listing_watchers(sorted(listing_ids.values())))
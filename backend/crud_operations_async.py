@@ -0,0 +1,196 @@
+# Async (AsyncSession) counterparts of the crud_operations functions used by the API,
+# the scheduler and the bulk tracking workers. They build the same statements; the
+# sync versions stay in crud_operations for scripts such as seed_db.py.
+
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+import schemas
+
+from crud_operations import (
+    _apply_price_drops, _claim_listings, _claim_track_job, _downsampled_price_history, _insert_tracked_listings,
+    _listing_rows, _lock_listings, _new_track_job, _polling_weight_total, _price_check_points, _price_history_page,
+    _price_history_rows, _price_rollup_bounds, _price_rollup_rows, _price_rollups, _product_values,
+    _refresh_listing_watchers, _release_listings, _rollup_granularity, _rollup_price_history, _track_job_claimable,
+    _tracked_products_for_user, _update_track_job, _upsert_listings, _upsert_price_history, _upsert_price_rollups,
+    _upsert_products, _upsert_tracked_product,
+)
+import models.user as user_model
+import models.product as product_model
+import models.track_job as track_job_model
+
+
+# --- User CRUD Operations ---
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    """Fetches a single user from the database by their email address."""
+    return await db.scalar(select(user_model.User).where(user_model.User.email == email))
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate, hashed_password: str):
+    """Creates a new user record in the database."""
+    db_user = user_model.User(email=user.email, hashed_password=hashed_password)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+
+# --- Product CRUD Operations ---
+
+async def upsert_tracked_product(db: AsyncSession, owner_id: int, scraped_product: schemas.ProductDetails):
+    """See crud_operations.upsert_tracked_product. Commits and returns the tracked product id."""
+    tracked_product_id, listing_id = (await db.execute(_upsert_tracked_product(owner_id, scraped_product))).one()
+    await db.execute(_refresh_listing_watchers([listing_id]))
+    await db.commit()
+    return tracked_product_id
+
+async def get_tracked_products_for_user(db: AsyncSession, user_id: int):
+    """Fetches all products a specific user is tracking, with their product details."""
+    return (await db.scalars(_tracked_products_for_user(user_id))).all()
+
+async def get_tracked_product_by_id(db: AsyncSession, tracked_product_id: int, user_id: int):
+    """Fetches a single tracked product (and its product details) by its ID, ensuring it belongs to the user."""
+    return await db.scalar(
+        select(product_model.TrackedProduct)
+        .options(joinedload(product_model.TrackedProduct.product))
+        .where(
+            product_model.TrackedProduct.id == tracked_product_id,
+            product_model.TrackedProduct.owner_id == user_id
+        )
+    )
+
+async def get_price_history(
+    db: AsyncSession, listing_id: int, start: Optional[datetime], end: Optional[datetime], max_points: int
+):
+    """
+    At most `max_points` (price, timestamp) rows outlining a listing's history.
+    Ranges too long to chart from raw rows at hourly resolution are read from
+    the rollups; listings without rollups fall back to downsampling the raw rows
+    (crud_operations._downsampled_price_history).
+    """
+    first, last = (await db.execute(_price_rollup_bounds(listing_id))).one()
+    if first is not None:
+        span = min(end or last, last) - max(start or first, first)
+        granularity = _rollup_granularity(span, max(max_points // 2 - 1, 1))
+        if granularity != "hour":
+            return (await db.execute(_rollup_price_history(listing_id, granularity, start, end, max_points))).all()
+    return (await db.execute(_downsampled_price_history(listing_id, start, end, max_points))).all()
+
+async def get_price_rollups(
+    db: AsyncSession, listing_id: int, granularity: str, start: Optional[datetime], end: Optional[datetime], limit: int
+):
+    """See crud_operations._price_rollups."""
+    return (await db.execute(_price_rollups(listing_id, granularity, start, end, limit))).all()
+
+async def get_price_history_page(
+    db: AsyncSession,
+    listing_id: int,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    after: Optional[Tuple[datetime, int]],
+    limit: int,
+):
+    """One page of raw (id, price, timestamp, last_seen, checks) runs; see crud_operations._price_history_page."""
+    return (await db.execute(_price_history_page(listing_id, start, end, after, limit))).all()
+
+async def delete_tracked_product(db: AsyncSession, tracked_product_id: int, user_id: int):
+    """
+    Deletes a tracked product record if it exists and belongs to the user; the
+    shared listing and its price history stay (see crud_operations.delete_tracked_product).
+    """
+    db_tracked_product = await get_tracked_product_by_id(db, tracked_product_id=tracked_product_id, user_id=user_id)
+    if db_tracked_product is None:
+        return None
+    await db.execute(_lock_listings([db_tracked_product.listing_id]))
+    await db.execute(
+        delete(product_model.TrackedProduct).where(product_model.TrackedProduct.id == tracked_product_id)
+    )
+    await db.execute(_refresh_listing_watchers([db_tracked_product.listing_id]))
+    await db.commit()
+    return db_tracked_product
+
+
+# --- Price Check Operations ---
+
+async def claim_listings(db: AsyncSession, lease_owner: str, limit: int, now: datetime, lease_seconds: int):
+    """See crud_operations._claim_listings. Commits, so the lease is visible to other workers at once."""
+    claimed = (await db.execute(_claim_listings(lease_owner, limit, now, lease_seconds))).all()
+    await db.commit()
+    return claimed
+
+async def get_polling_weight_total(db: AsyncSession, volatility_floor: float):
+    """See crud_operations._polling_weight_total."""
+    return await db.scalar(_polling_weight_total(volatility_floor))
+
+async def save_price_checks(
+    db: AsyncSession,
+    results: Iterable[Tuple[int, float, datetime, datetime]],
+    checked: Iterable[Tuple[int, datetime, datetime, float, Optional[float], Optional[datetime]]] = (),
+    lease_owner: Optional[str] = None,
+):
+    """See crud_operations.save_price_checks: one batch of results, in a single transaction. Returns the price drops."""
+    results = list(results)
+    drops = []
+    if results:
+        await db.execute(_upsert_price_history(_price_history_rows(results)))
+        await db.execute(_upsert_price_rollups(_price_rollup_rows(_price_check_points(results))))
+        drops = (await db.execute(_apply_price_drops([(listing_id, price) for listing_id, price, _, _ in results]))).all()
+    checked = list(checked)
+    if checked:
+        await db.execute(_release_listings(checked, lease_owner))
+    await db.commit()
+    return drops
+
+
+# --- Bulk Tracking Job Operations ---
+
+async def create_track_job(db: AsyncSession, owner_id: int, urls: List[str], errors: List[dict] = ()):
+    """See crud_operations.create_track_job."""
+    db_job = _new_track_job(owner_id, urls, errors)
+    db.add(db_job)
+    await db.commit()
+    await db.refresh(db_job)
+    return db_job
+
+async def get_track_job(db: AsyncSession, job_id: int, user_id: int):
+    """Fetches a bulk tracking job, ensuring it belongs to the user."""
+    return await db.scalar(select(track_job_model.TrackJob).where(
+        track_job_model.TrackJob.id == job_id,
+        track_job_model.TrackJob.owner_id == user_id
+    ))
+
+async def get_unfinished_track_job_ids(db: AsyncSession):
+    """See crud_operations.get_unfinished_track_job_ids."""
+    return (await db.scalars(
+        select(track_job_model.TrackJob.id)
+        .where(_track_job_claimable())
+        .order_by(track_job_model.TrackJob.id)
+    )).all()
+
+async def claim_track_job(db: AsyncSession, job_id: int, lease_owner: str, lease_seconds: int):
+    """See crud_operations._claim_track_job. Commits, so the lease is visible to other workers at once."""
+    claimed = (await db.execute(_claim_track_job(job_id, lease_owner, lease_seconds))).first()
+    await db.commit()
+    return claimed
+
+async def update_track_job(db: AsyncSession, job_id: int, lease_owner: Optional[str] = None, **fields):
+    """See crud_operations.update_track_job. Does not commit."""
+    return (await db.execute(_update_track_job(job_id, lease_owner, fields))).rowcount > 0
+
+async def get_tracked_urls_for_user(db: AsyncSession, user_id: int):
+    """Every URL the user already tracks."""
+    return (await db.scalars(
+        select(product_model.TrackedProduct.url).where(product_model.TrackedProduct.owner_id == user_id)
+    )).all()
+
+async def bulk_track_products(db: AsyncSession, owner_id: int, scraped_products: List[schemas.ProductDetails]):
+    """See crud_operations.bulk_track_products. Does not commit."""
+    if not scraped_products:
+        return
+    product_rows = {p.signature: _product_values(p) for p in scraped_products}
+    product_ids = dict((await db.execute(_upsert_products(list(product_rows.values())))).tuples().all())
+    listing_ids = dict((await db.execute(_upsert_listings(_listing_rows(scraped_products, product_ids)))).tuples().all())
+    await db.execute(_insert_tracked_listings(owner_id, scraped_products, product_ids, listing_ids))
+    await db.execute(_refresh_listing_watchers(sorted(listing_ids.values())))
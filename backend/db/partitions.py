@@ -0,0 +1,56 @@
+# db/partitions.py
+#
+# price_history is range-partitioned by month on timestamp (migration 0007), one
+# partition per month named price_history_yYYYYmMM, plus price_history_default for
+# rows outside all of them. ensure_price_history_partitions creates the partitions
+# for the current and next PRICE_HISTORY_PARTITION_MONTHS_AHEAD months before they
+# are needed; the scheduler calls it on every run.
+
+from datetime import date, datetime
+from sqlalchemy import text
+
+from core.config import settings
+from db.session import async_engine
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"price_history_y{month.year}m{month.month:02d}"
+
+
+async def ensure_price_history_partitions():
+    """Creates any missing monthly partitions for the coming months. Never raises."""
+    today = datetime.now()
+    months = [date(today.year, today.month, 1)]
+    for _ in range(settings.PRICE_HISTORY_PARTITION_MONTHS_AHEAD):
+        months.append(_next_month(months[-1]))
+
+    try:
+        async with async_engine.connect() as conn:
+            existing = set((await conn.scalars(text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass('price_history')"
+            ))).all())
+    except Exception as e:
+        print(f"PARTITIONS: Could not list the price_history partitions: {e}")
+        return
+    if not existing:
+        return # Not partitioned (migrations not applied yet)
+
+    for month in months:
+        name = partition_name(month)
+        if name in existing:
+            continue
+        try:
+            async with async_engine.begin() as conn:
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF price_history "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+                ))
+            print(f"PARTITIONS: Created {name}.")
+        except Exception as e:
+            # Another worker may have just created it, or price_history_default already holds rows for that month
+            print(f"PARTITIONS: Could not create {name}: {e}")
@@ -1,52 +1,60 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List, Union
+import asyncio
+from fastapi import FastAPI, Depends, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
 from core.config import settings
 
-import asyncio  # ADDED
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import timedelta
+from datetime import datetime, timedelta
 from core import security
-import crud_operations as crud_operations
-from api.deps import get_current_user
-from contextlib import asynccontextmanager
+import crud_operations_async as crud_operations
+from api.deps import get_current_user, get_db
+from contextlib import aclosing, asynccontextmanager
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from scheduler import check_all_prices
+from track_jobs import close_track_workers, enqueue_track_job, parse_url_csv, start_track_workers
 
 
-# Database imports
-from db.session import SessionLocal, engine
-from db.base import Base
+# Database imports (the schema itself is managed by Alembic: alembic upgrade head)
+from db.session import async_engine
 import models.user  # Import the user model file
 import models.product  # ADDED: ensure Product mapper is loaded
 import models.price_history  # ADDED: ensure PriceHistory is defined before mapper configuration
+import models.track_job
+import models.price_rollup
 
 # Schema imports
 import schemas as schemas
 
 # Security and scraping imports 
 from core.security import get_password_hash
-from scrapers.factory import scrape_url
-
-# Create all database tables (run this once)
-Base.metadata.create_all(bind=engine)
-
+from scrapers.factory import scrape_cache, scrape_many, scrape_url
+from scrapers.http_client import start_http_client, close_http_client
+from scrapers.parse_pool import start_parse_pool, close_parse_pool
 
 
 # --- LIFESPAN FUNCTION ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # This code runs on startup
+    await start_http_client()
+    start_parse_pool()
+    await start_track_workers()
     scheduler = AsyncIOScheduler()
-    # Schedule check_all_prices to run every X minutes
-    # !!! CHANGE interval for testing !!!
-    scheduler.add_job(check_all_prices, "interval", minutes=1440, misfire_grace_time=30)
+    # Look for due price checks every few minutes; API replicas and run_scheduler.py
+    # workers split the due products between them through DB leases
+    scheduler.add_job(check_all_prices, "interval", minutes=settings.SCHEDULER_POLL_MINUTES, misfire_grace_time=30)
     scheduler.start()
     print("Scheduler has been started...")
     yield
     # This code runs on shutdown
     scheduler.shutdown()
+    await close_track_workers()
+    await close_http_client()
+    close_parse_pool()
+    await async_engine.dispose()
     print("Scheduler has been shut down.")
 
 
@@ -75,13 +83,7 @@ app.add_middleware(
 
 
 
-# Dependency to get a DB session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# DB sessions come from api.deps.get_db (an AsyncSession per request)
 
 
 
@@ -96,26 +98,29 @@ def read_root():
     return {"message": "Welcome to the Price Tracker API!"}
 
 
+@app.get("/status/scrape-cache", response_model=schemas.ScrapeCacheStats)
+def read_scrape_cache_stats():
+    """
+    Hit/miss counters of the shared scrape cache since the API started.
+    """
+    return scrape_cache.stats()
+
+
 @app.post("/auth/register", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.user.User).filter(
-        models.user.User.email == user.email).first()
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await crud_operations.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = get_password_hash(user.password)
-    db_user = models.user.User(
-        email=user.email, hashed_password=hashed_password)
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    # bcrypt is deliberately slow; keep it off the event loop
+    hashed_password = await asyncio.to_thread(get_password_hash, user.password)
+    return await crud_operations.create_user(db, user=user, hashed_password=hashed_password)
 
 
 @app.post("/auth/login", response_model=schemas.Token)
-def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(db: AsyncSession = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
     # Authenticate the user
-    user = security.authenticate_user(
+    user = await security.authenticate_user(
         db, email=form_data.username, password=form_data.password)
     if not user:
         raise HTTPException(
@@ -143,33 +148,54 @@ def read_users_me(current_user: models.user.User = Depends(get_current_user)):
 
 # --- Scraper Endpoint ---
 @app.post("/scrape", response_model=List[Union[schemas.ProductDetails, schemas.ErrorResponse]])
-async def scrape_products(request: schemas.ScrapeRequest):
+async def scrape_products(request: schemas.ScrapeRequest, http_request: Request, stream: bool = False):
+    """
+    Scrapes every URL in the request, at most SCRAPE_API_MAX_CONCURRENCY at a time.
+
+    With `?stream=true` (or `Accept: application/x-ndjson`) each result is sent as
+    one line of NDJSON as soon as it is ready, in completion order; otherwise the
+    results come back as one JSON list, in request order.
+    """
     # Note: We will protect this endpoint later
     if not request.urls:
         raise HTTPException(
             status_code=400, detail="URL list cannot be empty.")
+    if len(request.urls) > settings.SCRAPE_API_MAX_BATCH:
+        raise HTTPException(
+            status_code=413, detail=f"Too many URLs: at most {settings.SCRAPE_API_MAX_BATCH} per request.")
+
+    urls = [str(url) for url in request.urls]
+    results = scrape_many(urls, settings.SCRAPE_API_MAX_CONCURRENCY)
 
-    tasks = [scrape_url(str(url)) for url in request.urls]
-    results = await asyncio.gather(*tasks)
+    if stream or "application/x-ndjson" in http_request.headers.get("accept", ""):
+        async def ndjson_lines():
+            async with aclosing(results):
+                async for _, result in results:
+                    yield result.model_dump_json() + "\n"
 
-    return results
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+    ordered = [None] * len(urls)
+    async for index, result in results:
+        ordered[index] = result
+    return ordered
 
 
 @app.get("/track", response_model=List[schemas.TrackedProductResponse])
-def get_tracked_products(
-    db: Session = Depends(get_db),
+async def get_tracked_products(
+    db: AsyncSession = Depends(get_db),
     current_user: models.user.User = Depends(get_current_user)
 ):
     """
     Fetches a list of all products the currently authenticated user is tracking.
     """
-    return crud_operations.get_tracked_products_for_user(db=db, user_id=current_user.id)
+    return await crud_operations.get_tracked_products_for_user(db=db, user_id=current_user.id)
 
 
 @app.post("/track", response_model=schemas.ProductDetails)
 async def track_product(
     request: schemas.ScrapeRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.user.User = Depends(get_current_user)
 ):
     url_to_track = str(request.urls[0])  # Assuming one URL for now
@@ -180,35 +206,80 @@ async def track_product(
         raise HTTPException(
             status_code=400, detail=f"Could not scrape URL: {scraped_data.error}")
 
-    # 2. Check if this product already exists in our 'products' table
-    product = crud_operations.get_product_by_signature(
-        db, signature=scraped_data.signature)
-    if not product:
-        # If not, create it
-        product = crud_operations.create_product(
-            db, scraped_product=scraped_data)
-
-    # 3. Create the link between the user and the product
-    crud_operations.create_tracked_product_for_user(
-        db=db,
-        user=current_user,
-        product=product,
-        listing=scraped_data.listing  # <-- UPDATED LINE
-    )
+    # 2. Create or reuse the product and link it to the user, in one statement
+    await crud_operations.upsert_tracked_product(
+        db, owner_id=current_user.id, scraped_product=scraped_data)
 
     return scraped_data
 
 
+async def _create_track_job(db: AsyncSession, user: models.user.User, urls: List[str], errors: List[dict] = ()):
+    if not urls and not errors:
+        raise HTTPException(status_code=400, detail="URL list cannot be empty.")
+    if len(urls) + len(errors) > settings.TRACK_JOB_MAX_URLS:
+        raise HTTPException(
+            status_code=413, detail=f"Too many URLs: at most {settings.TRACK_JOB_MAX_URLS} per job.")
+    job = await crud_operations.create_track_job(db, owner_id=user.id, urls=urls, errors=errors)
+    enqueue_track_job(job.id)
+    return job
+
+
+@app.post("/track/bulk", response_model=schemas.TrackJobResponse, status_code=202)
+async def track_products_bulk(
+    request: schemas.ScrapeRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.user.User = Depends(get_current_user)
+):
+    """
+    Queues every URL in the request for tracking and returns the job right away;
+    poll GET /track/jobs/{job_id} for its progress.
+    """
+    return await _create_track_job(db, current_user, [str(url) for url in request.urls])
+
+
+@app.post("/track/bulk/csv", response_model=schemas.TrackJobResponse, status_code=202)
+async def track_products_bulk_csv(
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.user.User = Depends(get_current_user)
+):
+    """
+    Same as POST /track/bulk, for an uploaded CSV file of URLs (a "url" column,
+    or one URL per line).
+    """
+    try:
+        text = (await file.read()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="The CSV file must be UTF-8 encoded.")
+    urls, errors = parse_url_csv(text)
+    return await _create_track_job(db, current_user, urls, errors)
+
+
+@app.get("/track/jobs/{job_id}", response_model=schemas.TrackJobResponse)
+async def get_track_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.user.User = Depends(get_current_user)
+):
+    """
+    Reports the progress of a bulk tracking job.
+    """
+    job = await crud_operations.get_track_job(db, job_id=job_id, user_id=current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Tracking job not found")
+    return job
+
+
 @app.get("/track/{tracked_product_id}", response_model=schemas.SingleTrackedProductResponse)
-def get_single_tracked_product(
+async def get_single_tracked_product(
     tracked_product_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.user.User = Depends(get_current_user)
 ):
     """
     Fetches the full details of a single product a user is tracking.
     """
-    db_tracked_product = crud_operations.get_tracked_product_by_id(
+    db_tracked_product = await crud_operations.get_tracked_product_by_id(
         db, tracked_product_id=tracked_product_id, user_id=current_user.id
     )
     if db_tracked_product is None:
@@ -216,33 +287,115 @@ def get_single_tracked_product(
     return db_tracked_product
 
 
+async def _get_owned_tracked_product(db: AsyncSession, tracked_product_id: int, user_id: int):
+    db_tracked_product = await crud_operations.get_tracked_product_by_id(
+        db, tracked_product_id=tracked_product_id, user_id=user_id
+    )
+    if db_tracked_product is None:
+        raise HTTPException(status_code=404, detail="Tracked product not found")
+    return db_tracked_product
+
+
+def _stored_time(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Price history times are stored as naive local times (datetime.now()), so a
+    timezone-aware query value (e.g. JS toISOString()'s "...Z") is converted to that clock.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
 @app.get("/track/{tracked_product_id}/history", response_model=List[schemas.PriceHistoryPoint])
-def get_product_price_history(
+async def get_product_price_history(
     tracked_product_id: int,
-    db: Session = Depends(get_db),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    max_points: int = Query(settings.HISTORY_DEFAULT_POINTS, ge=4, le=settings.HISTORY_MAX_POINTS),
+    db: AsyncSession = Depends(get_db),
     current_user: models.user.User = Depends(get_current_user)
 ):
     """
-    Fetches the price history for a single tracked product for charts.
+    Fetches the price history for a single tracked product for charts, between
+    `from` and `to` (default: all of it). Long histories are downsampled in the
+    database to at most `max_points` points that keep the lows and highs; use
+    /history/export for every raw point.
     """
-    db_tracked_product = crud_operations.get_tracked_product_by_id(
-        db, tracked_product_id=tracked_product_id, user_id=current_user.id
+    tracked_product = await _get_owned_tracked_product(db, tracked_product_id, current_user.id)
+    return await crud_operations.get_price_history(
+        db, tracked_product.listing_id, _stored_time(start), _stored_time(end), max_points
     )
-    if db_tracked_product is None:
-        raise HTTPException(status_code=404, detail="Tracked product not found")
-    return db_tracked_product.price_history
+
+
+@app.get("/track/{tracked_product_id}/history/rollups", response_model=List[schemas.PriceRollupResponse])
+async def get_product_price_rollups(
+    tracked_product_id: int,
+    granularity: str = Query("day", pattern="^(hour|day|month)$"),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(settings.HISTORY_MAX_POINTS, ge=1, le=settings.HISTORY_MAX_POINTS),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.user.User = Depends(get_current_user)
+):
+    """
+    Hourly, daily or monthly open/close/min/max/avg price and check count of a
+    tracked product between `from` and `to`, oldest first.
+    """
+    tracked_product = await _get_owned_tracked_product(db, tracked_product_id, current_user.id)
+    return await crud_operations.get_price_rollups(
+        db, tracked_product.listing_id, granularity, _stored_time(start), _stored_time(end), limit
+    )
+
+
+def _encode_history_cursor(timestamp: datetime, point_id: int) -> str:
+    return f"{timestamp.isoformat()},{point_id}"
+
+def _decode_history_cursor(cursor: str):
+    try:
+        timestamp, point_id = cursor.rsplit(",", 1)
+        return _stored_time(datetime.fromisoformat(timestamp)), int(point_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/track/{tracked_product_id}/history/export", response_model=schemas.PriceHistoryExport)
+async def export_product_price_history(
+    tracked_product_id: int,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.HISTORY_EXPORT_PAGE_SIZE, ge=1, le=settings.HISTORY_EXPORT_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.user.User = Depends(get_current_user)
+):
+    """
+    Every raw price history run of a tracked product (a price, when it was first
+    and last seen, and over how many checks), oldest first, one page at a time.
+    Pass the returned `next_cursor` back to get the following page.
+    """
+    tracked_product = await _get_owned_tracked_product(db, tracked_product_id, current_user.id)
+    after = _decode_history_cursor(cursor) if cursor else None
+    # One extra row tells whether there is another page
+    rows = await crud_operations.get_price_history_page(
+        db, tracked_product.listing_id, _stored_time(start), _stored_time(end), after, limit + 1
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_history_cursor(rows[-1].timestamp, rows[-1].id)
+    return {"points": rows, "next_cursor": next_cursor}
 
 
 @app.delete("/track/{tracked_product_id}", response_model=schemas.Msg)
-def delete_tracked_product(
+async def delete_tracked_product(
     tracked_product_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.user.User = Depends(get_current_user)
 ):
     """
     Stops tracking (deletes) a product for the current user.
     """
-    deleted_product = crud_operations.delete_tracked_product(
+    deleted_product = await crud_operations.delete_tracked_product(
         db, tracked_product_id=tracked_product_id, user_id=current_user.id
     )
     if deleted_product is None:
@@ -0,0 +1,102 @@
+"""baseline schema
+
+The tables as Base.metadata.create_all created them before the schema was put
+under migrations. Databases that were set up that way already have them; only
+the missing ones are created, so `alembic upgrade head` works on those too. The
+later migrations bring them up to date.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 03:54:03.540746
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _missing(table: str) -> bool:
+    return not sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if _missing('products'):
+        op.create_table('products',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('signature', sa.String(), nullable=False),
+            sa.Column('name', sa.String(), nullable=True),
+            sa.Column('brand', sa.String(), nullable=True),
+            sa.Column('category_path', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+            sa.Column('image_urls', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+            sa.Column('key_features', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+            sa.Column('specifications', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_products_id'), 'products', ['id'], unique=False)
+        op.create_index(op.f('ix_products_signature'), 'products', ['signature'], unique=True)
+    if _missing('users'):
+        op.create_table('users',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('email', sa.String(), nullable=False),
+            sa.Column('hashed_password', sa.String(), nullable=False),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+        op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    if _missing('tracked_products'):
+        op.create_table('tracked_products',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('url', sa.String(), nullable=False),
+            sa.Column('initial_price', sa.Numeric(precision=10, scale=2), nullable=True),
+            sa.Column('current_price', sa.Numeric(precision=10, scale=2), nullable=True),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+            sa.Column('mrp', sa.Numeric(precision=10, scale=2), nullable=True),
+            sa.Column('currency', sa.String(length=10), nullable=True),
+            sa.Column('stock_status', sa.String(), nullable=True),
+            sa.Column('seller_name', sa.String(), nullable=True),
+            sa.Column('average_rating', sa.Numeric(precision=3, scale=2), nullable=True),
+            sa.Column('num_ratings', sa.Integer(), nullable=True),
+            sa.Column('offers', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+            sa.Column('owner_id', sa.Integer(), nullable=True),
+            sa.Column('product_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+            sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_tracked_products_id'), 'tracked_products', ['id'], unique=False)
+    if _missing('price_history'):
+        op.create_table('price_history',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('tracked_product_id', sa.Integer(), nullable=False),
+            sa.Column('price', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.Column('timestamp', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+            sa.ForeignKeyConstraint(['tracked_product_id'], ['tracked_products.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_price_history_id'), 'price_history', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_price_history_id'), table_name='price_history')
+    op.drop_table('price_history')
+    op.drop_index(op.f('ix_tracked_products_id'), table_name='tracked_products')
+    op.drop_table('tracked_products')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+    op.drop_index(op.f('ix_products_signature'), table_name='products')
+    op.drop_index(op.f('ix_products_id'), table_name='products')
+    op.drop_table('products')
@@ -0,0 +1,53 @@
+"""track jobs
+
+Bulk tracking jobs (POST /track/bulk), worked through by track_jobs.py.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 04:31:25.832435
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # create_all made the table on databases that ran the app before migrations existed
+    if sa.inspect(op.get_bind()).has_table('track_jobs'):
+        return
+    op.create_table('track_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('urls', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('processed', sa.Integer(), nullable=False),
+        sa.Column('succeeded', sa.Integer(), nullable=False),
+        sa.Column('skipped', sa.Integer(), nullable=False),
+        sa.Column('failed', sa.Integer(), nullable=False),
+        sa.Column('errors', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_track_jobs_id'), 'track_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_track_jobs_owner_id'), 'track_jobs', ['owner_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_track_jobs_owner_id'), table_name='track_jobs')
+    op.drop_index(op.f('ix_track_jobs_id'), table_name='track_jobs')
+    op.drop_table('track_jobs')
@@ -0,0 +1,54 @@
+"""tracked products owner url unique
+
+A user tracks each URL once: (owner_id, url) becomes unique, which is also the
+conflict target of the tracking upserts. Rows the old code let a user add twice
+are merged into the oldest one, which takes over their price history.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 04:31:25.832435
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases created by create_all after this change already have the constraint
+    constraints = sa.inspect(op.get_bind()).get_unique_constraints('tracked_products')
+    if any(c['name'] == 'uq_tracked_products_owner_url' for c in constraints):
+        return
+    op.execute(
+        "CREATE TEMPORARY TABLE tracked_product_duplicates ON COMMIT DROP AS "
+        "SELECT id, min(id) OVER (PARTITION BY owner_id, url) AS keep_id FROM tracked_products"
+    )
+    op.execute(
+        "UPDATE price_history SET tracked_product_id = d.keep_id "
+        "FROM tracked_product_duplicates d WHERE d.id = price_history.tracked_product_id AND d.id <> d.keep_id "
+        "AND NOT EXISTS (SELECT 1 FROM price_history kept "
+        "  WHERE kept.tracked_product_id = d.keep_id AND kept.timestamp = price_history.timestamp)"
+    )
+    # Whatever is left is a check the kept row already has
+    op.execute(
+        "DELETE FROM price_history USING tracked_product_duplicates d "
+        "WHERE d.id = price_history.tracked_product_id AND d.id <> d.keep_id"
+    )
+    op.execute(
+        "DELETE FROM tracked_products USING tracked_product_duplicates d "
+        "WHERE d.id = tracked_products.id AND d.id <> d.keep_id"
+    )
+    op.create_unique_constraint('uq_tracked_products_owner_url', 'tracked_products', ['owner_id', 'url'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_tracked_products_owner_url', 'tracked_products', type_='unique')
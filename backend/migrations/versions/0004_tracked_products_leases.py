@@ -0,0 +1,40 @@
+"""tracked products leases
+
+When each tracked product was last checked, and which scheduler worker holds
+it until when, so several workers can split the price check between them.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 04:31:25.832435
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases created by create_all after this change already have the columns
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('tracked_products')}
+    if 'lease_owner' in columns:
+        return
+    op.add_column('tracked_products', sa.Column('last_checked_at', sa.DateTime(), nullable=True))
+    op.add_column('tracked_products', sa.Column('lease_owner', sa.String(), nullable=True))
+    op.add_column('tracked_products', sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_tracked_products_last_checked_at'), 'tracked_products', ['last_checked_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_tracked_products_last_checked_at'), table_name='tracked_products')
+    op.drop_column('tracked_products', 'lease_expires_at')
+    op.drop_column('tracked_products', 'lease_owner')
+    op.drop_column('tracked_products', 'last_checked_at')
@@ -0,0 +1,45 @@
+"""tracked products polling
+
+Per-product check intervals: next_check_at (NULL means due at once) replaces
+ordering by last_checked_at, and last_price / volatility record how often the
+price moves (polling.py). url is indexed for counting a listing's watchers.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 04:31:25.832435
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases created by create_all after this change already have the columns
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('tracked_products')}
+    if 'volatility' in columns:
+        return
+    op.drop_index(op.f('ix_tracked_products_last_checked_at'), table_name='tracked_products')
+    op.add_column('tracked_products', sa.Column('next_check_at', sa.DateTime(), nullable=True))
+    op.add_column('tracked_products', sa.Column('last_price', sa.Numeric(precision=10, scale=2), nullable=True))
+    op.add_column('tracked_products', sa.Column('volatility', sa.Float(), server_default='0.5', nullable=False))
+    op.create_index(op.f('ix_tracked_products_next_check_at'), 'tracked_products', ['next_check_at'], unique=False)
+    op.create_index(op.f('ix_tracked_products_url'), 'tracked_products', ['url'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_tracked_products_url'), table_name='tracked_products')
+    op.drop_index(op.f('ix_tracked_products_next_check_at'), table_name='tracked_products')
+    op.drop_column('tracked_products', 'volatility')
+    op.drop_column('tracked_products', 'last_price')
+    op.drop_column('tracked_products', 'next_check_at')
+    op.create_index(op.f('ix_tracked_products_last_checked_at'), 'tracked_products', ['last_checked_at'], unique=False)
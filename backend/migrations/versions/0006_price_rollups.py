@@ -0,0 +1,50 @@
+"""price rollups
+
+Hourly, daily and monthly open/close/min/max/avg of each tracked product's
+price history, kept up to date by the scheduler (crud_operations._upsert_price_rollups).
+Existing history is rolled up with rebuild_rollups.py.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 04:31:25.832435
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # create_all made the table on databases that ran the app before migrations existed
+    if sa.inspect(op.get_bind()).has_table('price_rollups'):
+        return
+    op.create_table('price_rollups',
+        sa.Column('tracked_product_id', sa.Integer(), nullable=False),
+        sa.Column('granularity', sa.String(length=5), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('open_price', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('open_at', sa.DateTime(), nullable=False),
+        sa.Column('close_price', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('close_at', sa.DateTime(), nullable=False),
+        sa.Column('min_price', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('min_at', sa.DateTime(), nullable=False),
+        sa.Column('max_price', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('max_at', sa.DateTime(), nullable=False),
+        sa.Column('price_sum', sa.Numeric(precision=16, scale=2), nullable=False),
+        sa.Column('price_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['tracked_product_id'], ['tracked_products.id'], ),
+        sa.PrimaryKeyConstraint('tracked_product_id', 'granularity', 'bucket_start')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('price_rollups')
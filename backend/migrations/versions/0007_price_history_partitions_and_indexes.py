@@ -0,0 +1,105 @@
+"""price history partitions and indexes
+
+Indexes for the scheduler's scans of active tracked products and for per-product
+price history reads, and monthly range partitioning of price_history. The
+existing rows are copied into the partitioned table; partitions for later months
+are created at runtime (db/partitions.py).
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 04:02:11.314266
+
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partitions created up front for the months after the current one
+MONTHS_AHEAD = 3
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _create_partition(month: date):
+    op.execute(
+        f"CREATE TABLE price_history_y{month.year}m{month.month:02d} PARTITION OF price_history "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index('ix_tracked_products_next_check_at', table_name='tracked_products')
+    op.create_index('ix_tracked_products_active_id', 'tracked_products', ['id'], unique=False, postgresql_where='is_active')
+    op.create_index('ix_tracked_products_active_next_check_at', 'tracked_products', ['next_check_at'], unique=False, postgresql_where='is_active')
+
+    # Move the plain table aside (keeping its id sequence), create the partitioned one and copy the rows over
+    op.rename_table('price_history', 'price_history_unpartitioned')
+    op.execute("ALTER TABLE price_history_unpartitioned RENAME CONSTRAINT price_history_pkey TO price_history_unpartitioned_pkey")
+    op.execute("ALTER SEQUENCE price_history_id_seq OWNED BY NONE")
+    op.drop_index('ix_price_history_id', table_name='price_history_unpartitioned')
+    op.create_table('price_history',
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('price_history_id_seq')"), nullable=False),
+        sa.Column('tracked_product_id', sa.Integer(), nullable=False),
+        sa.Column('price', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['tracked_product_id'], ['tracked_products.id'], ),
+        sa.PrimaryKeyConstraint('id', 'timestamp'),
+        postgresql_partition_by='RANGE (timestamp)',
+    )
+    op.execute("ALTER SEQUENCE price_history_id_seq OWNED BY price_history.id")
+    op.create_index('ix_price_history_tracked_product_id_timestamp', 'price_history', ['tracked_product_id', 'timestamp'], unique=False)
+
+    # One partition per month from the oldest row to a few months ahead; anything else goes to the default one
+    op.execute("CREATE TABLE price_history_default PARTITION OF price_history DEFAULT")
+    first = op.get_bind().scalar(sa.text("SELECT min(timestamp) FROM price_history_unpartitioned")) or datetime.now()
+    today = date.today()
+    last = date(today.year, today.month, 1)
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+    month = date(first.year, first.month, 1)
+    while month <= last:
+        _create_partition(month)
+        month = _next_month(month)
+
+    op.execute(
+        "INSERT INTO price_history (id, tracked_product_id, price, timestamp) "
+        "SELECT id, tracked_product_id, price, coalesce(timestamp, now()) FROM price_history_unpartitioned"
+    )
+    op.drop_table('price_history_unpartitioned')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_table('price_history_unpartitioned',
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('price_history_id_seq')"), nullable=False),
+        sa.Column('tracked_product_id', sa.Integer(), nullable=False),
+        sa.Column('price', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['tracked_product_id'], ['tracked_products.id'], ),
+        sa.PrimaryKeyConstraint('id', name='price_history_unpartitioned_pkey'),
+    )
+    op.execute(
+        "INSERT INTO price_history_unpartitioned (id, tracked_product_id, price, timestamp) "
+        "SELECT id, tracked_product_id, price, timestamp FROM price_history"
+    )
+    op.execute("ALTER SEQUENCE price_history_id_seq OWNED BY NONE")
+    op.drop_table('price_history') # Drops the partitions with it
+    op.rename_table('price_history_unpartitioned', 'price_history')
+    op.execute("ALTER TABLE price_history RENAME CONSTRAINT price_history_unpartitioned_pkey TO price_history_pkey")
+    op.execute("ALTER SEQUENCE price_history_id_seq OWNED BY price_history.id")
+    op.create_index(op.f('ix_price_history_id'), 'price_history', ['id'], unique=False)
+
+    op.drop_index('ix_tracked_products_active_next_check_at', table_name='tracked_products', postgresql_where='is_active')
+    op.drop_index('ix_tracked_products_active_id', table_name='tracked_products', postgresql_where='is_active')
+    op.create_index(op.f('ix_tracked_products_next_check_at'), 'tracked_products', ['next_check_at'], unique=False)
@@ -0,0 +1,79 @@
+"""run-length price history
+
+price_history rows become runs of one price: first seen at `timestamp`, last
+seen at `last_seen`, over `checks` checks. Consecutive rows of the same price of
+a product are merged into one run, and tracked_products.last_price_since records
+where the current run started so the scheduler can extend it.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 09:41:27.508113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tracked_products', sa.Column('last_price_since', sa.DateTime(), nullable=True))
+    op.add_column('price_history', sa.Column('last_seen', sa.DateTime(), server_default=sa.text('now()'), nullable=True))
+    op.add_column('price_history', sa.Column('checks', sa.Integer(), server_default='1', nullable=False))
+
+    # Most rows go away, so the runs are built aside and the table refilled rather than deleted from row by row
+    op.execute(
+        "CREATE TEMPORARY TABLE price_history_runs ON COMMIT DROP AS "
+        "SELECT min(id) AS id, tracked_product_id, price, min(timestamp) AS timestamp, "
+        "max(timestamp) AS last_seen, count(*) AS checks "
+        "FROM ("
+        "  SELECT *, sum(starts_run) OVER (PARTITION BY tracked_product_id ORDER BY timestamp, id) AS run"
+        "  FROM ("
+        "    SELECT id, tracked_product_id, price, timestamp,"
+        "      CASE WHEN lag(price) OVER (PARTITION BY tracked_product_id ORDER BY timestamp, id)"
+        "        IS DISTINCT FROM price THEN 1 ELSE 0 END AS starts_run"
+        "    FROM price_history"
+        "  ) AS ordered"
+        ") AS numbered "
+        "GROUP BY tracked_product_id, run, price"
+    )
+    op.execute("TRUNCATE price_history")
+    op.execute(
+        "INSERT INTO price_history (id, tracked_product_id, price, timestamp, last_seen, checks) "
+        "SELECT id, tracked_product_id, price, timestamp, last_seen, checks FROM price_history_runs"
+    )
+    op.alter_column('price_history', 'last_seen', existing_type=sa.DateTime(), nullable=False)
+    op.drop_index('ix_price_history_tracked_product_id_timestamp', table_name='price_history')
+    op.create_index('ix_price_history_tracked_product_id_timestamp', 'price_history', ['tracked_product_id', 'timestamp'], unique=True)
+
+    # The current run is the latest one, if it is still at the last price seen
+    op.execute(
+        "UPDATE tracked_products SET last_price_since = latest.timestamp "
+        "FROM ("
+        "  SELECT DISTINCT ON (tracked_product_id) tracked_product_id, price, timestamp"
+        "  FROM price_history ORDER BY tracked_product_id, timestamp DESC"
+        ") AS latest "
+        "WHERE latest.tracked_product_id = tracked_products.id AND latest.price = tracked_products.last_price"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Each run goes back to a point where it was first and one where it was last seen;
+    # the checks in between are not recoverable
+    op.execute(
+        "INSERT INTO price_history (tracked_product_id, price, timestamp) "
+        "SELECT tracked_product_id, price, last_seen FROM price_history WHERE last_seen > timestamp"
+    )
+    op.drop_index('ix_price_history_tracked_product_id_timestamp', table_name='price_history')
+    op.create_index('ix_price_history_tracked_product_id_timestamp', 'price_history', ['tracked_product_id', 'timestamp'], unique=False)
+    op.drop_column('price_history', 'checks')
+    op.drop_column('price_history', 'last_seen')
+    op.drop_column('tracked_products', 'last_price_since')
@@ -0,0 +1,237 @@
+"""shared listings
+
+One listings row per canonical URL holds the price history, the rollups and the
+price-check schedule that every tracked_products row used to keep its own copy
+of. Each user's tracked row points at its listing. The per-user copies of a
+listing's history are collapsed into one series: runs that overlap at the same
+price are the same checks, seen by several subscribers.
+
+Older rows still hold the URL as the user pasted it (slug paths, ref tags, query
+strings), so rows are grouped by their canonical URL and rewritten to it. The
+canonicalizer is a frozen copy of scrapers.urls.canonicalize_url as of this
+migration, so later changes to it don't change what the migration does. A user who tracked one listing under several URLs keeps the
+oldest of those rows.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 11:06:52.130947
+
+"""
+import re
+from typing import Sequence, Union
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_AMAZON_HOST = re.compile(r"^(?:www\.)?amazon\.[a-z.]+$")
+_AMAZON_ASIN = re.compile(r"/(?:dp|gp/product|gp/aw/d|exec/obidos/asin|o/asin)/([A-Z0-9]{10})(?:[/?]|$)", re.IGNORECASE)
+_TRACKING_PARAMS = {"ref", "ref_", "tag", "fbclid", "gclid", "dclid", "msclkid", "igshid", "mc_cid", "mc_eid"}
+
+
+def canonicalize_url(url: str) -> str:
+    """scrapers.urls.canonicalize_url as it was when this migration was written; keep it unchanged."""
+    parts = urlparse(url.strip())
+    host = parts.netloc.lower()
+
+    if _AMAZON_HOST.match(host):
+        match = _AMAZON_ASIN.search(parts.path)
+        if match:
+            if not host.startswith("www."):
+                host = "www." + host
+            return f"https://{host}/dp/{match.group(1).upper()}"
+
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in _TRACKING_PARAMS and not key.lower().startswith(("utm_", "pf_rd_", "pd_rd_"))
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urlunparse((parts.scheme.lower() or "https", host, path, "", urlencode(sorted(query)), ""))
+
+
+# Scheduling state that moves from tracked_products to listings
+SCHEDULING_COLUMNS = "last_checked_at, next_check_at, last_price, last_price_since, volatility"
+
+
+def _scheduling_columns():
+    return [
+        sa.Column('last_checked_at', sa.DateTime(), nullable=True),
+        sa.Column('next_check_at', sa.DateTime(), nullable=True),
+        sa.Column('lease_owner', sa.String(), nullable=True),
+        sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+        sa.Column('last_price', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('last_price_since', sa.DateTime(), nullable=True),
+        sa.Column('volatility', sa.Float(), server_default='0.5', nullable=False),
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('listings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=True),
+        sa.Column('watchers', sa.Integer(), server_default='0', nullable=False),
+        *_scheduling_columns(),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('url'),
+    )
+    op.create_index('ix_listings_watched_next_check_at', 'listings', [sa.text('next_check_at NULLS FIRST')], unique=False, postgresql_where='watchers > 0')
+
+    # The canonical URL of every tracked row; canonicalize_url has no SQL equivalent
+    bind = op.get_bind()
+    op.execute("CREATE TEMPORARY TABLE canonical_urls (id integer PRIMARY KEY, url varchar NOT NULL) ON COMMIT DROP")
+    rows = [{"id": id, "url": canonicalize_url(url)} for id, url in bind.execute(sa.text("SELECT id, url FROM tracked_products"))]
+    if rows:
+        bind.execute(sa.text("INSERT INTO canonical_urls (id, url) VALUES (:id, :url)"), rows)
+
+    # A listing per canonical URL, scheduled like its most recently checked subscriber
+    op.execute(
+        f"INSERT INTO listings (url, product_id, {SCHEDULING_COLUMNS}) "
+        f"SELECT DISTINCT ON (c.url) c.url, product_id, {SCHEDULING_COLUMNS} "
+        "FROM tracked_products t JOIN canonical_urls c ON c.id = t.id "
+        "ORDER BY c.url, is_active IS TRUE DESC, last_checked_at DESC NULLS LAST, t.id"
+    )
+    op.add_column('tracked_products', sa.Column('listing_id', sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE tracked_products SET listing_id = listings.id FROM canonical_urls c JOIN listings ON listings.url = c.url "
+        "WHERE c.id = tracked_products.id"
+    )
+    op.alter_column('tracked_products', 'listing_id', existing_type=sa.Integer(), nullable=False)
+    op.create_foreign_key('tracked_products_listing_id_fkey', 'tracked_products', 'listings', ['listing_id'], ['id'])
+    op.create_index(op.f('ix_tracked_products_listing_id'), 'tracked_products', ['listing_id'], unique=False)
+
+    # One series per listing. Sorted by start, a run belongs with the one before it when it has the
+    # same price and starts before everything so far in the listing has ended.
+    op.execute(
+        "CREATE TEMPORARY TABLE listing_price_history ON COMMIT DROP AS "
+        "SELECT min(id) AS id, listing_id, price, min(timestamp) AS timestamp, max(last_seen) AS last_seen, "
+        "max(checks) AS checks "
+        "FROM ("
+        "  SELECT *, sum(starts_run) OVER (PARTITION BY listing_id ORDER BY timestamp, id) AS run"
+        "  FROM ("
+        "    SELECT h.id, t.listing_id, h.price, h.timestamp, h.last_seen, h.checks,"
+        "      CASE WHEN h.price IS DISTINCT FROM lag(h.price) OVER w"
+        "        OR h.timestamp > max(h.last_seen) OVER (w ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)"
+        "        THEN 1 ELSE 0 END AS starts_run"
+        "    FROM price_history h JOIN tracked_products t ON t.id = h.tracked_product_id"
+        "    WINDOW w AS (PARTITION BY t.listing_id ORDER BY h.timestamp, h.id)"
+        "  ) AS ordered"
+        ") AS numbered "
+        "GROUP BY listing_id, run, price"
+    )
+    op.execute("TRUNCATE price_history")
+    op.drop_index('ix_price_history_tracked_product_id_timestamp', table_name='price_history')
+    op.drop_column('price_history', 'tracked_product_id')
+    op.add_column('price_history', sa.Column('listing_id', sa.Integer(), nullable=False))
+    op.create_foreign_key('price_history_listing_id_fkey', 'price_history', 'listings', ['listing_id'], ['id'])
+    op.execute(
+        "INSERT INTO price_history (id, listing_id, price, timestamp, last_seen, checks) "
+        "SELECT id, listing_id, price, timestamp, last_seen, checks FROM listing_price_history"
+    )
+    op.create_index('ix_price_history_listing_id_timestamp', 'price_history', ['listing_id', 'timestamp'], unique=True)
+
+    # The subscribers' copies of a bucket only differ in how much history each had; keep the fullest
+    op.execute(
+        "CREATE TEMPORARY TABLE listing_price_rollups ON COMMIT DROP AS "
+        "SELECT DISTINCT ON (t.listing_id, r.granularity, r.bucket_start) t.listing_id, r.* "
+        "FROM price_rollups r JOIN tracked_products t ON t.id = r.tracked_product_id "
+        "ORDER BY t.listing_id, r.granularity, r.bucket_start, r.price_count DESC"
+    )
+    op.execute("TRUNCATE price_rollups")
+    op.drop_column('price_rollups', 'tracked_product_id') # Drops the primary key with it
+    op.add_column('price_rollups', sa.Column('listing_id', sa.Integer(), nullable=False))
+    op.create_foreign_key('price_rollups_listing_id_fkey', 'price_rollups', 'listings', ['listing_id'], ['id'])
+    op.create_primary_key('price_rollups_pkey', 'price_rollups', ['listing_id', 'granularity', 'bucket_start'])
+    op.execute(
+        "INSERT INTO price_rollups (listing_id, granularity, bucket_start, open_price, open_at, close_price, close_at, "
+        "min_price, min_at, max_price, max_at, price_sum, price_count) "
+        "SELECT listing_id, granularity, bucket_start, open_price, open_at, close_price, close_at, "
+        "min_price, min_at, max_price, max_at, price_sum, price_count FROM listing_price_rollups"
+    )
+
+    # One row per user and listing, the oldest (active first), now that the history no longer hangs off them
+    op.execute(
+        "DELETE FROM tracked_products WHERE id IN ("
+        "  SELECT id FROM ("
+        "    SELECT id, row_number() OVER (PARTITION BY owner_id, listing_id ORDER BY is_active IS TRUE DESC, id) AS n"
+        "    FROM tracked_products"
+        "  ) AS ranked WHERE n > 1"
+        ")"
+    )
+    op.execute("UPDATE tracked_products SET url = c.url FROM canonical_urls c WHERE c.id = tracked_products.id")
+    op.execute(
+        "UPDATE listings SET watchers = "
+        "(SELECT count(*) FROM tracked_products t WHERE t.listing_id = listings.id AND t.is_active)"
+    )
+
+    # Merging may have moved the start of the current runs
+    op.execute(
+        "UPDATE listings SET last_price_since = latest.timestamp "
+        "FROM ("
+        "  SELECT DISTINCT ON (listing_id) listing_id, price, timestamp"
+        "  FROM price_history ORDER BY listing_id, timestamp DESC"
+        ") AS latest "
+        "WHERE latest.listing_id = listings.id AND latest.price = listings.last_price"
+    )
+
+    op.drop_index('ix_tracked_products_active_next_check_at', table_name='tracked_products', postgresql_where='is_active')
+    for column in _scheduling_columns():
+        op.drop_column('tracked_products', column.name)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Every subscriber gets its own copy of the listing's schedule, history and rollups again
+    for column in _scheduling_columns():
+        op.add_column('tracked_products', column)
+    op.execute(
+        f"UPDATE tracked_products SET ({SCHEDULING_COLUMNS}) = "
+        f"(SELECT {SCHEDULING_COLUMNS} FROM listings WHERE listings.id = tracked_products.listing_id)"
+    )
+    op.create_index('ix_tracked_products_active_next_check_at', 'tracked_products', ['next_check_at'], unique=False, postgresql_where='is_active')
+
+    op.execute(
+        "CREATE TEMPORARY TABLE tracked_price_history ON COMMIT DROP AS "
+        "SELECT t.id AS tracked_product_id, h.price, h.timestamp, h.last_seen, h.checks "
+        "FROM price_history h JOIN tracked_products t ON t.listing_id = h.listing_id"
+    )
+    op.execute("TRUNCATE price_history")
+    op.drop_index('ix_price_history_listing_id_timestamp', table_name='price_history')
+    op.drop_column('price_history', 'listing_id')
+    op.add_column('price_history', sa.Column('tracked_product_id', sa.Integer(), nullable=False))
+    op.create_foreign_key('price_history_tracked_product_id_fkey', 'price_history', 'tracked_products', ['tracked_product_id'], ['id'])
+    op.execute(
+        "INSERT INTO price_history (tracked_product_id, price, timestamp, last_seen, checks) "
+        "SELECT tracked_product_id, price, timestamp, last_seen, checks FROM tracked_price_history"
+    )
+    op.create_index('ix_price_history_tracked_product_id_timestamp', 'price_history', ['tracked_product_id', 'timestamp'], unique=True)
+
+    op.execute(
+        "CREATE TEMPORARY TABLE tracked_price_rollups ON COMMIT DROP AS "
+        "SELECT t.id AS tracked_product_id, r.* FROM price_rollups r JOIN tracked_products t ON t.listing_id = r.listing_id"
+    )
+    op.execute("TRUNCATE price_rollups")
+    op.drop_column('price_rollups', 'listing_id')
+    op.add_column('price_rollups', sa.Column('tracked_product_id', sa.Integer(), nullable=False))
+    op.create_foreign_key('price_rollups_tracked_product_id_fkey', 'price_rollups', 'tracked_products', ['tracked_product_id'], ['id'])
+    op.create_primary_key('price_rollups_pkey', 'price_rollups', ['tracked_product_id', 'granularity', 'bucket_start'])
+    op.execute(
+        "INSERT INTO price_rollups (tracked_product_id, granularity, bucket_start, open_price, open_at, close_price, "
+        "close_at, min_price, min_at, max_price, max_at, price_sum, price_count) "
+        "SELECT tracked_product_id, granularity, bucket_start, open_price, open_at, close_price, close_at, "
+        "min_price, min_at, max_price, max_at, price_sum, price_count FROM tracked_price_rollups"
+    )
+
+    op.drop_index(op.f('ix_tracked_products_listing_id'), table_name='tracked_products')
+    op.drop_constraint('tracked_products_listing_id_fkey', 'tracked_products', type_='foreignkey')
+    op.drop_column('tracked_products', 'listing_id')
+    op.drop_index('ix_listings_watched_next_check_at', table_name='listings', postgresql_where='watchers > 0')
+    op.drop_table('listings')
@@ -0,0 +1,32 @@
+"""track job leases
+
+Which process is running each bulk tracking job and until when, so only one
+replica works on a job and jobs of a process that died are resumed once.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 09:12:47.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, Sequence[str], None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('track_jobs', sa.Column('lease_owner', sa.String(), nullable=True))
+    op.add_column('track_jobs', sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('track_jobs', 'lease_expires_at')
+    op.drop_column('track_jobs', 'lease_owner')
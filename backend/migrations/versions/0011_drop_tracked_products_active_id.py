@@ -0,0 +1,30 @@
+"""drop tracked products active id index
+
+The scheduler claims listings (ix_listings_watched_next_check_at) instead of
+paging active tracked products by id, so nothing reads this index any more.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 10:05:31.847120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, Sequence[str], None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index('ix_tracked_products_active_id', table_name='tracked_products', postgresql_where='is_active')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_tracked_products_active_id', 'tracked_products', ['id'], unique=False, postgresql_where='is_active')
@@ -1,13 +1,23 @@
-from sqlalchemy import Column, Integer, Numeric, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, Numeric, DateTime, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from db.base import Base
 
 class PriceHistory(Base):
     __tablename__ = "price_history"
+    # Range-partitioned by month on timestamp (see db/partitions.py), so the partition
+    # key has to be part of the primary key
+    __table_args__ = (
+        # Also the conflict target that extends a listing's current run (crud_operations._upsert_price_history)
+        Index("ix_price_history_listing_id_timestamp", "listing_id", "timestamp", unique=True),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    tracked_product_id = Column(Integer, ForeignKey("tracked_products.id"), nullable=False)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    listing_id = Column(Integer, ForeignKey("listings.id"), nullable=False)
     price = Column(Numeric(10, 2), nullable=False)
-    timestamp = Column(DateTime, server_default=func.now())
+    # A row is a run of checks that all saw this price: first seen at timestamp, last seen at last_seen
+    timestamp = Column(DateTime, primary_key=True, nullable=False, server_default=func.now())
+    last_seen = Column(DateTime, nullable=False, server_default=func.now())
+    checks = Column(Integer, nullable=False, server_default="1")
 
-    tracked_product = relationship("TrackedProduct", back_populates="price_history")
\ No newline at end of file
+    listing = relationship("Listing", back_populates="price_history")
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, Numeric, String, DateTime, ForeignKey
+from db.base import Base
+
+class PriceRollup(Base):
+    """
+    Pre-aggregated price history: one row per listing per hour, day or month
+    bucket. Kept up to date by the scheduler's writes (see
+    crud_operations._upsert_price_rollups); rebuild_rollups.py recomputes them
+    from price_history.
+    """
+    __tablename__ = "price_rollups"
+
+    listing_id = Column(Integer, ForeignKey("listings.id"), primary_key=True)
+    granularity = Column(String(5), primary_key=True) # hour, day or month
+    bucket_start = Column(DateTime, primary_key=True)
+
+    # Each price comes with the time it was seen, so later points can be merged in out of order
+    open_price = Column(Numeric(10, 2), nullable=False)
+    open_at = Column(DateTime, nullable=False)
+    close_price = Column(Numeric(10, 2), nullable=False)
+    close_at = Column(DateTime, nullable=False)
+    min_price = Column(Numeric(10, 2), nullable=False)
+    min_at = Column(DateTime, nullable=False)
+    max_price = Column(Numeric(10, 2), nullable=False)
+    max_at = Column(DateTime, nullable=False)
+    price_sum = Column(Numeric(16, 2), nullable=False) # avg = price_sum / price_count
+    price_count = Column(Integer, nullable=False)
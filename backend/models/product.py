@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Numeric, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Boolean, Numeric, DateTime, Float, ForeignKey, Index, UniqueConstraint, func
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import JSONB
 from db.base import Base
@@ -17,14 +17,54 @@ class Product(Base):
     specifications = Column(JSONB)
     # The relationship that was here has been moved to TrackedProduct
 
+class Listing(Base):
+    """
+    A canonical product URL, shared by every user who tracks it. Its price series
+    (price_history, price_rollups) and price-check scheduling state are stored
+    once here, however many TrackedProduct rows point at it.
+    """
+    __tablename__ = "listings"
+
+    id = Column(Integer, primary_key=True)
+    url = Column(String, nullable=False, unique=True)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    # Active tracked rows pointing here (see crud_operations._refresh_listing_watchers)
+    watchers = Column(Integer, nullable=False, server_default="0")
+
+    # Price-check scheduling: when the listing was last and is next due to be checked, which
+    # worker holds it until when, and how often its price moves (see polling.py)
+    last_checked_at = Column(DateTime)
+    next_check_at = Column(DateTime) # NULL: never checked, due at once
+    lease_owner = Column(String)
+    lease_expires_at = Column(DateTime)
+    last_price = Column(Numeric(10, 2)) # Price seen by the last check
+    last_price_since = Column(DateTime) # Start of last_price's run in price_history
+    volatility = Column(Float, nullable=False, server_default="0.5")
+
+    product = relationship("Product")
+    price_history = relationship("PriceHistory", back_populates="listing")
+
+# The scheduler's due-time priority queue: only listings someone is watching get checked, and
+# NULLS FIRST matches the claim's ORDER BY (never-checked listings are due first), so a claim
+# reads the due listings straight off the index instead of sorting them
+Index(
+    "ix_listings_watched_next_check_at", Listing.next_check_at.asc().nulls_first(),
+    postgresql_where="watchers > 0",
+)
+
 class TrackedProduct(Base):
     """Links a User to a specific Product URL they are tracking."""
     __tablename__ = "tracked_products"
-    
+    __table_args__ = (
+        # A user tracks each (canonical) URL once; also the conflict target for upserts,
+        # and the index behind every per-user lookup (owner_id is its first column)
+        UniqueConstraint("owner_id", "url", name="uq_tracked_products_owner_url"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
-    url = Column(String, nullable=False)
+    url = Column(String, nullable=False, index=True)
     initial_price = Column(Numeric(10, 2))
-    current_price = Column(Numeric(10, 2))
+    current_price = Column(Numeric(10, 2)) # Lowest price seen since tracking started
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, server_default=func.now())
     mrp = Column(Numeric(10, 2))
@@ -34,13 +74,12 @@ class TrackedProduct(Base):
     average_rating = Column(Numeric(3, 2))
     num_ratings = Column(Integer)
     offers = Column(JSONB)
-    
+
     owner_id = Column(Integer, ForeignKey("users.id"))
     product_id = Column(Integer, ForeignKey("products.id"))
+    # The shared listing holding this URL's price history and check schedule
+    listing_id = Column(Integer, ForeignKey("listings.id"), nullable=False, index=True)
 
     owner = relationship("User", back_populates="tracked_products")
     product = relationship("Product")
-    
-    # --- MOVED HERE ---
-    # This correctly links a TrackedProduct to its many PriceHistory entries.
-    price_history = relationship("PriceHistory", back_populates="tracked_product", cascade="all, delete-orphan")
\ No newline at end of file
+    listing = relationship("Listing")
\ No newline at end of file
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func
+from sqlalchemy.dialects.postgresql import JSONB
+from db.base import Base
+
+class TrackJob(Base):
+    """A bulk tracking request: URLs a user asked to track, worked through in the background."""
+    __tablename__ = "track_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(String(20), nullable=False, default="queued") # queued, running, done or failed
+    urls = Column(JSONB, nullable=False)
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    succeeded = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0) # Already tracked, or repeated within the job
+    failed = Column(Integer, nullable=False, default=0)
+    errors = Column(JSONB, nullable=False, default=list) # [{"url": ..., "error": ...}]
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    # Which process is running the job, until when (see crud_operations._claim_track_job)
+    lease_owner = Column(String)
+    lease_expires_at = Column(DateTime)
@@ -0,0 +1,45 @@
+# polling.py
+#
+# How often each tracked URL is price-checked. Every URL gets a weight,
+#
+#     weight = (volatility + SCHEDULER_VOLATILITY_FLOOR) * (1 + log2(watchers))
+#
+# where volatility is a moving average of "the price changed since the last check"
+# (0..1) and watchers is the number of active tracked rows sharing the URL. The
+# interval is scale / weight, with one global scale chosen so the intervals add up
+# to SCHEDULER_REQUESTS_PER_HOUR: sum(1 / interval) = sum(weight) / scale = budget.
+# Intervals are clamped to [SCHEDULER_MIN_CHECK_INTERVAL_HOURS, SCHEDULER_MAX_CHECK_INTERVAL_HOURS].
+#
+# crud_operations._polling_weight_total computes sum(weight) in SQL with the same formula.
+
+import math
+from datetime import timedelta
+from typing import Optional
+
+from core.config import settings
+
+
+def polling_weight(volatility: float, watchers: int) -> float:
+    return (volatility + settings.SCHEDULER_VOLATILITY_FLOOR) * (1 + math.log2(max(watchers, 1)))
+
+
+def budget_scale_hours(total_weight: Optional[float]) -> float:
+    """The global scale for a catalog whose URL weights add up to `total_weight`."""
+    if not total_weight or settings.SCHEDULER_REQUESTS_PER_HOUR <= 0:
+        return settings.SCHEDULER_MAX_CHECK_INTERVAL_HOURS
+    return total_weight / settings.SCHEDULER_REQUESTS_PER_HOUR
+
+
+def check_interval(volatility: float, watchers: int, scale_hours: float) -> timedelta:
+    hours = scale_hours / polling_weight(volatility, watchers)
+    hours = min(max(hours, settings.SCHEDULER_MIN_CHECK_INTERVAL_HOURS), settings.SCHEDULER_MAX_CHECK_INTERVAL_HOURS)
+    return timedelta(hours=hours)
+
+
+def update_volatility(volatility: float, last_price, new_price) -> float:
+    """Folds one successful check into the volatility average; the first check only sets the baseline."""
+    if last_price is None:
+        return volatility
+    changed = 1.0 if float(new_price) != float(last_price) else 0.0
+    alpha = settings.SCHEDULER_VOLATILITY_ALPHA
+    return (1 - alpha) * volatility + alpha * changed
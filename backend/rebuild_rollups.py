@@ -0,0 +1,52 @@
+# rebuild_rollups.py
+#
+# Recomputes the price_rollups table (hourly/daily/monthly open, close, min, max,
+# avg and count per listing) from price_history. The scheduler keeps the
+# rollups up to date as it records prices; run this once to backfill existing
+# history, or after editing price_history by hand. Listings are rebuilt in
+# batches, each in its own transaction.
+#
+#   python rebuild_rollups.py [--listing 12 --listing 34] [--batch-size 200]
+
+import argparse
+from sqlalchemy.orm import Session
+
+from db.session import SessionLocal
+import crud_operations
+import models.user  # Load every mapper before querying
+import models.product
+import models.price_history
+import models.price_rollup
+
+BATCH_SIZE = 200
+
+
+def rebuild_rollups(listing_ids=None, batch_size=BATCH_SIZE):
+    db: Session = SessionLocal()
+    rebuilt = 0
+    try:
+        if listing_ids:
+            batches = (listing_ids[i:i + batch_size] for i in range(0, len(listing_ids), batch_size))
+        else:
+            batches = _all_listing_ids(db, batch_size)
+        for batch in batches:
+            crud_operations.rebuild_price_rollups(db, batch)
+            rebuilt += len(batch)
+    finally:
+        db.close()
+    print(f"Rebuilt the price rollups of {rebuilt} listings.")
+
+
+def _all_listing_ids(db: Session, batch_size: int):
+    after_id = 0
+    while batch := crud_operations.get_listing_ids_page(db, after_id, batch_size):
+        yield batch
+        after_id = batch[-1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the price rollup tables from price_history.")
+    parser.add_argument("--listing", type=int, action="append", dest="listings", help="Only this listing id (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Listings rebuilt per transaction")
+    args = parser.parse_args()
+    rebuild_rollups(args.listings, args.batch_size)
@@ -0,0 +1,138 @@
+# reextract_archive.py
+#
+# Re-runs the current scrapers over the raw HTML archive (PAGE_ARCHIVE_DIR) on all
+# cores, with no network access, and backfills price_history and products with the
+# results. Run it after shipping a scraper fix for an Amazon markup change.
+#
+#   python reextract_archive.py [--since 2025-01-01] [--until 2025-02-01] [--workers 8] [--dry-run]
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from sqlalchemy.orm import Session
+
+from db.session import SessionLocal
+import crud_operations
+import models.user  # Load every mapper before querying
+import models.product
+import models.price_history
+import models.price_rollup
+from rebuild_rollups import rebuild_rollups
+from scrapers.archive import get_page_archive
+from scrapers.factory import PROFILE_FULL, PROFILE_LISTING, parse_page
+from scrapers.urls import canonicalize_url
+
+BATCH_SIZE = 1000
+# Archive records handed to the pool at a time (ProcessPoolExecutor.map submits its whole input up front)
+CHUNK_SIZE = 10_000
+
+
+def _extract(record):
+    """Worker process: decompress and parse one archived page."""
+    try:
+        body = get_page_archive().read(record["sha256"])
+        # Pages the scheduler cut short only hold the listing fields
+        profile = PROFILE_FULL if record["complete"] else PROFILE_LISTING
+        return record, parse_page(record["url"], body, profile), None
+    except Exception as e:
+        return record, None, str(e)
+
+
+def _load_listings():
+    """Maps each canonical URL to the (listing_id, product_id) of its listing."""
+    db: Session = SessionLocal()
+    try:
+        return {
+            canonicalize_url(url): (listing_id, product_id)
+            for listing_id, url, product_id in crud_operations.get_all_listing_links(db)
+        }
+    finally:
+        db.close()
+
+
+def _write_history(points: dict, dry_run: bool):
+    if dry_run or not points:
+        return
+    db: Session = SessionLocal()
+    try:
+        crud_operations.replace_price_history(
+            db, [(listing_id, price, timestamp) for (listing_id, timestamp), price in points.items()]
+        )
+    finally:
+        db.close()
+
+
+def reextract(since=None, until=None, workers=None, dry_run=False):
+    archive = get_page_archive()
+    if archive is None:
+        print("Error: PAGE_ARCHIVE_DIR is not set, there is no archive to re-extract.")
+        return
+
+    listings = _load_listings()
+    stats = {"pages": 0, "failed": 0, "points": 0}
+    points = {} # (listing_id, timestamp) -> price, flushed every BATCH_SIZE
+    touched = set() # Listings whose history was rewritten
+    latest_products = {} # canonical URL -> (fetched_at, ProductDetails) from the newest full page
+
+    def apply(record, result, error):
+        nonlocal points
+        stats["pages"] += 1
+        if error:
+            stats["failed"] += 1
+            print(f"Could not re-extract {record['url']} ({record['sha256'][:12]}): {error}")
+            return
+
+        key = canonicalize_url(record["url"])
+        listing = result.listing if record["complete"] else result
+        if listing.price is not None and key in listings:
+            listing_id, _ = listings[key]
+            points[(listing_id, record["fetched_at"])] = listing.price
+            touched.add(listing_id)
+        if record["complete"] and (key not in latest_products or latest_products[key][0] < record["fetched_at"]):
+            latest_products[key] = (record["fetched_at"], result)
+
+        if len(points) >= BATCH_SIZE:
+            stats["points"] += len(points)
+            _write_history(points, dry_run)
+            points = {}
+
+    records = archive.records(since, until)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        while chunk := list(islice(records, CHUNK_SIZE)):
+            for record, result, error in pool.map(_extract, chunk, chunksize=16):
+                apply(record, result, error)
+
+    stats["points"] += len(points)
+    _write_history(points, dry_run)
+    if not dry_run and touched:
+        # Replaced points may have changed any bucket's open/close/min/max
+        rebuild_rollups(sorted(touched))
+
+    updated_products = 0
+    db: Session = SessionLocal()
+    try:
+        for key, (_, product) in latest_products.items():
+            _, product_id = listings.get(key, (None, None))
+            if product_id:
+                if not dry_run:
+                    crud_operations.update_product_details(db, product_id, product)
+                updated_products += 1
+        db.commit()
+    finally:
+        db.close()
+
+    prefix = "[dry run] " if dry_run else ""
+    print(f"{prefix}Re-extracted {stats['pages']} archived pages ({stats['failed']} failed): "
+          f"{stats['points']} price history points and {updated_products} products backfilled.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-extract archived pages and backfill the database.")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Only pages fetched at or after this date/time")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Only pages fetched before this date/time")
+    parser.add_argument("--workers", type=int, help="Parser processes (default: one per CPU core)")
+    parser.add_argument("--dry-run", action="store_true", help="Parse everything but write nothing")
+    args = parser.parse_args()
+    reextract(args.since, args.until, args.workers, args.dry_run)
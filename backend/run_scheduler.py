@@ -1,20 +1,33 @@
 import asyncio
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from scheduler import check_all_prices
+from core.config import settings
+from db.session import async_engine
+from scrapers.http_client import start_http_client, close_http_client
+from scrapers.parse_pool import start_parse_pool, close_parse_pool
 
 async def main():
+    await start_http_client()
+    start_parse_pool()
     scheduler = AsyncIOScheduler()
-    # Run immediately on start, then every 24 hours
-    scheduler.add_job(check_all_prices, "interval", hours=24, misfire_grace_time=900)
+    # Look for due price checks every few minutes; start as many of these workers as needed,
+    # on any number of nodes: they split the due products between them through DB leases
+    scheduler.add_job(check_all_prices, "interval", minutes=settings.SCHEDULER_POLL_MINUTES, misfire_grace_time=900)
     scheduler.start()
     print("Scheduler started in background worker mode. Press Ctrl+C to exit.")
 
-    # Keep the script running indefinitely
-    while True:
-        await asyncio.sleep(3600) # Sleep for an hour
+    try:
+        # Keep the script running indefinitely
+        while True:
+            await asyncio.sleep(3600) # Sleep for an hour
+    finally:
+        scheduler.shutdown()
+        await close_http_client()
+        close_parse_pool()
+        await async_engine.dispose()
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
-        print("Scheduler stopped.")
\ No newline at end of file
+        print("Scheduler stopped.")
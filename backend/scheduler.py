@@ -1,46 +1,317 @@
 import asyncio
-from sqlalchemy.orm import Session
+import os
+import socket
+import time
+from collections import Counter
+from datetime import datetime
 
-from db.session import SessionLocal
-import crud_operations
-from scrapers.factory import scrape_url
-import schemas
+from core.config import settings
+from db.partitions import ensure_price_history_partitions
+from db.session import AsyncSessionLocal
+import crud_operations_async as crud_operations
+from polling import budget_scale_hours, check_interval, update_volatility
+from scrapers.factory import (
+    PROFILE_LISTING, archive_page, breakers, fetch_listing_page, fetch_page, fingerprint_page, get_breaker,
+    parse_page, scrape_cache, supported_domains,
+)
+from scrapers.failures import FAILURE_CIRCUIT_OPEN, FAILURE_PARSE_ERROR, classify_failure
+from scrapers.fingerprints import PageFingerprint, page_fingerprints
+from scrapers.parse_pool import parse_concurrency, run_parser
+from scrapers.throttle import DomainThrottle
+from scrapers.urls import canonicalize_url
 
-async def check_all_prices():
+# Marks the end of a pipeline queue
+_DONE = object()
+
+# Identifies this process's leases on listings rows
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def _run_stage(inbox: asyncio.Queue, outbox: asyncio.Queue, handler, workers: int):
+    """
+    Runs `workers` copies of `handler` over everything in `inbox`, forwarding
+    non-None results to `outbox`. Closes `outbox` once the inbox is drained.
+    """
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                await inbox.put(_DONE) # Let the sibling workers see it too
+                return
+            result = await handler(item)
+            if result is not None:
+                await outbox.put(result)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    await outbox.put(_DONE)
+
+
+class _ListingCheck:
     """
-    The main job that runs on a schedule. It fetches all active tracked products,
-    concurrently re-scrapes them, and saves the new price history.
+    The price check of one claimed listing, shared by all of its subscribers. A
+    failed check has price None and a failure kind; a deferred one (its domain's
+    circuit breaker is open) was never attempted.
     """
-    print("SCHEDULER: Running daily price check...")
-    db: Session = SessionLocal()
+    __slots__ = ("listing", "url", "price", "checked_at", "failure", "defer_until")
 
+    def __init__(self, listing):
+        self.listing = listing
+        self.url = canonicalize_url(listing.url)
+        self.price = None
+        self.checked_at = None
+        self.failure = None
+        self.defer_until = None
+
+
+async def _claim_batch(now: datetime):
+    async with AsyncSessionLocal() as db:
+        return await crud_operations.claim_listings(
+            db,
+            lease_owner=WORKER_ID,
+            limit=settings.SCHEDULER_READ_BATCH_SIZE,
+            now=now,
+            lease_seconds=settings.SCHEDULER_LEASE_SECONDS,
+        )
+
+
+async def _polling_scale_hours():
+    """The interval scale that keeps the whole catalog within SCHEDULER_REQUESTS_PER_HOUR (see polling.py)."""
+    async with AsyncSessionLocal() as db:
+        total_weight = await crud_operations.get_polling_weight_total(db, settings.SCHEDULER_VOLATILITY_FLOOR)
+    return budget_scale_hours(total_weight)
+
+
+async def _claim_listings(fetch_queue: asyncio.Queue, stats: dict):
+    """
+    Streams due listings into the pipeline, most overdue first, leasing one
+    batch at a time so other scheduler processes claim the rest. Claiming stops
+    when nothing due is left. Each listing is one URL, fetched once however
+    many users track it.
+    """
+    now = datetime.now()
     try:
-        tracked_items = crud_operations.get_all_active_tracked_products(db)
-        if not tracked_items:
-            print("SCHEDULER: No active products to track.")
-            return
-
-        # Create a list of scraping tasks to run concurrently
-        tasks = [scrape_url(item.url) for item in tracked_items]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        for item, result in zip(tracked_items, results):
-            if isinstance(result, schemas.ProductDetails) and result.listing.price is not None:
-                new_price = result.listing.price
-
-                # Always save the new price to the history table
-                crud_operations.add_price_history_record(db, tracked_product_id=item.id, price=new_price)
-
-                # Check for a price drop and update the main record
-                if new_price < item.current_price:
-                    print(f"PRICE DROP! Item: {item.product.name}, Old: {item.current_price}, New: {new_price}")
-                    crud_operations.update_tracked_product_price(db, tracked_product_id=item.id, new_price=new_price)
-                    # TODO: Add notification logic here (e.g., send_email)
-                else:
-                     print(f"Price check for {item.product.name}: No drop. Current: {new_price}")
-
-            elif isinstance(result, Exception):
-                print(f"SCHEDULER: Error scraping {item.url}: {result}")
+        while True:
+            batch = await _claim_batch(now)
+            if not batch:
+                break
+            for listing in batch:
+                stats["listings"] += 1
+                stats["watchers"] += listing.watchers
+                await fetch_queue.put(_ListingCheck(listing))
+    except Exception as e:
+        print(f"SCHEDULER: Error claiming listings: {e}")
     finally:
-        db.close()
-        print("SCHEDULER: Job finished.")
\ No newline at end of file
+        await fetch_queue.put(_DONE)
+
+
+async def _write_results(batch, scale_hours: float):
+    """
+    Saves one batch of listing checks in a single transaction, schedules each
+    listing's next check from its updated volatility and releases the leases.
+    Failed checks (price None) are rescheduled too, with their volatility
+    unchanged; deferred listings keep everything but move to the breaker's retry
+    time. A price equal to the last one extends the current history run (which
+    started at last_price_since) instead of starting a new one.
+    """
+    checked = []
+    results = []
+    for check in batch:
+        listing = check.listing
+        if check.defer_until is not None:
+            checked.append((listing.id, listing.last_checked_at, check.defer_until, listing.volatility,
+                            listing.last_price, listing.last_price_since))
+            continue
+        new_price, checked_at = check.price, check.checked_at
+        volatility, last_price, last_price_since = listing.volatility, listing.last_price, listing.last_price_since
+        if new_price is not None:
+            volatility = update_volatility(listing.volatility, listing.last_price, new_price)
+            if last_price is None or last_price_since is None or float(new_price) != float(last_price):
+                last_price_since = checked_at
+            last_price = new_price
+        next_check_at = checked_at + check_interval(volatility, listing.watchers, scale_hours)
+        checked.append((listing.id, checked_at, next_check_at, volatility, last_price, last_price_since))
+        if new_price is not None:
+            results.append((listing.id, new_price, checked_at, last_price_since))
+
+    async with AsyncSessionLocal() as db:
+        # Always save the new price to the history table; subscribers' current_price follows drops
+        drops = await crud_operations.save_price_checks(
+            db,
+            results=results,
+            checked=checked,
+            lease_owner=WORKER_ID,
+        )
+
+    names = {check.listing.id: check.listing.product_name for check in batch}
+    for drop in drops:
+        print(f"PRICE DROP! Item: {names[drop.listing_id]}, Old: {drop.old_price}, New: {drop.new_price} "
+              f"(tracked product {drop.id})")
+        # TODO: Add notification logic here (e.g., send_email)
+    dropped = {drop.listing_id for drop in drops}
+    for listing_id, new_price, _, _ in results:
+        if listing_id not in dropped:
+            print(f"Price check for {names[listing_id]}: No drop. Current: {new_price}")
+
+
+async def check_all_prices():
+    """
+    The main job that runs on a schedule, in any number of processes at once.
+    Due listings stream through a bounded pipeline (claimed batches -> fetch ->
+    parse -> batched writes), so memory stays flat whatever the catalog size and
+    prices land in the database as the run progresses. Each process only works
+    on the listings it has leased.
+    """
+    print(f"SCHEDULER: Running price check as {WORKER_ID}...")
+    await ensure_price_history_partitions()
+    throttle = DomainThrottle.from_settings(supported_domains())
+    fetch_queue = asyncio.Queue(maxsize=settings.SCHEDULER_QUEUE_SIZE)
+    # Fetched pages are big, so only a handful wait for the parser at a time
+    parse_queue = asyncio.Queue(maxsize=settings.SCHEDULER_FETCH_WORKERS)
+    write_queue = asyncio.Queue(maxsize=settings.SCHEDULER_QUEUE_SIZE)
+    stats = {
+        "listings": 0, "watchers": 0, "checked": 0, "failed": 0, "deferred": 0,
+        "bytes": 0, "truncated": 0, "refetched": 0, "unchanged": 0,
+    }
+    failures = Counter()
+    scale_hours = await _polling_scale_hours()
+
+    def finish(check: _ListingCheck, price=None, failure=None, defer_until=None):
+        """Records the outcome of the check and returns it, to be saved; price None means failed."""
+        check.price = price
+        check.failure = failure
+        check.defer_until = defer_until
+        check.checked_at = check.checked_at or datetime.now()
+        return check
+
+    async def fetch(check):
+        # A paused domain is skipped without waiting on it, so the fetch workers move on to other domains
+        breaker = get_breaker(check.url)
+        if breaker is not None and not breaker.available():
+            await write_queue.put(finish(check, defer_until=breaker.retry_at()))
+            return None
+        previous = page_fingerprints.get(check.url)
+        try:
+            async with throttle.slot(check.url):
+                page = await fetch_listing_page(
+                    check.url,
+                    etag=previous.etag if previous else None,
+                    last_modified=previous.last_modified if previous else None,
+                )
+        except Exception as e:
+            kind = classify_failure(e)
+            if kind == FAILURE_CIRCUIT_OPEN:
+                await write_queue.put(finish(check, defer_until=breaker.retry_at()))
+            else:
+                print(f"SCHEDULER: Error scraping {check.url} ({kind}): {e}")
+                await write_queue.put(finish(check, failure=kind))
+            return None
+        # The fetch time is the check's timestamp, in price history and in the page archive
+        check.checked_at = datetime.now()
+        if page.not_modified:
+            # A 304 has no body to count, archive or parse; validators were only sent if there is a previous fetch
+            stats["unchanged"] += 1
+            await write_queue.put(finish(check, previous.listing.price))
+            return None
+        stats["bytes"] += len(page.body)
+        stats["truncated"] += not page.complete
+        await archive_page(check.url, page.body, check.checked_at, page.complete)
+
+        # Same price-region fingerprint as the last check: skip parsing
+        digest = fingerprint_page(check.url, page.body)
+        if previous and digest is not None and digest == previous.digest:
+            stats["unchanged"] += 1
+            await write_queue.put(finish(check, previous.listing.price))
+            return None
+        return check, page, digest
+
+    async def parse(fetched):
+        check, page, digest = fetched
+        refetching = False
+        try:
+            # Only the listing fields are needed for a price check
+            listing = await run_parser(parse_page, check.url, page.body, PROFILE_LISTING)
+            if listing.price is None and not page.complete:
+                # The cut-off page didn't have the price after all; try the whole page
+                stats["refetched"] += 1
+                refetching = True
+                async with throttle.slot(check.url):
+                    body = await fetch_page(check.url)
+                refetching = False
+                stats["bytes"] += len(body)
+                await archive_page(check.url, body, check.checked_at)
+                digest = fingerprint_page(check.url, body)
+                listing = await run_parser(parse_page, check.url, body, PROFILE_LISTING)
+        except Exception as e:
+            kind = classify_failure(e) if refetching else FAILURE_PARSE_ERROR
+            print(f"SCHEDULER: Error parsing {check.url} ({kind}): {e}")
+            return finish(check, failure=kind)
+        if listing.price is None:
+            print(f"SCHEDULER: No price found for {check.url}")
+            return finish(check, failure=FAILURE_PARSE_ERROR)
+        page_fingerprints.put(check.url, PageFingerprint(digest, page.etag, page.last_modified, listing))
+        return finish(check, listing.price)
+
+    async def write():
+        batch = []
+        flush_at = None
+        while True:
+            # Wait for more results, but no longer than the oldest one in the batch may wait
+            timeout = None if flush_at is None else max(flush_at - time.monotonic(), 0)
+            try:
+                checked = await asyncio.wait_for(write_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                checked = None
+            if checked is not None and checked is not _DONE:
+                if not batch:
+                    flush_at = time.monotonic() + settings.SCHEDULER_WRITE_FLUSH_SECONDS
+                batch.append(checked)
+            if batch and (checked is None or checked is _DONE or len(batch) >= settings.SCHEDULER_WRITE_BATCH_SIZE):
+                try:
+                    await _write_results(batch, scale_hours)
+                    for check in batch:
+                        if check.defer_until is not None:
+                            stats["deferred"] += 1
+                        elif check.price is None:
+                            stats["failed"] += 1
+                            failures[check.failure] += 1
+                        else:
+                            stats["checked"] += 1
+                except Exception as e:
+                    # The leases run out on their own, so these listings are claimed again later
+                    stats["failed"] += len(batch)
+                    print(f"SCHEDULER: Error saving {len(batch)} results: {e}")
+                batch = []
+                flush_at = None
+            if checked is _DONE:
+                return
+
+    await asyncio.gather(
+        _claim_listings(fetch_queue, stats),
+        _run_stage(fetch_queue, parse_queue, fetch, settings.SCHEDULER_FETCH_WORKERS),
+        _run_stage(parse_queue, write_queue, parse, parse_concurrency()),
+        write(),
+    )
+
+    # The API's scrape cache lives in this process too; its counters are cumulative since startup
+    cache_stats = scrape_cache.stats()
+    print(f"SCHEDULER: Scrape cache: {cache_stats['hits']} hits, {cache_stats['coalesced']} coalesced, "
+          f"{cache_stats['misses']} misses (hit ratio {cache_stats['hit_ratio']:.1%}), {cache_stats['entries']} entries.")
+    if not stats["listings"]:
+        print("SCHEDULER: No listings are due.")
+        return
+    print(f"SCHEDULER: {stats['listings']} listings checked for {stats['watchers']} tracked products.")
+    for domain, domain_stats in throttle.report().items():
+        print(f"SCHEDULER: {domain}: {domain_stats['requests']} requests at {domain_stats['requests_per_second']} req/s "
+              f"(peak in-flight {domain_stats['peak_in_flight']}/{domain_stats['max_in_flight']}, limit {domain_stats['rate_limit']} req/s)")
+    print(f"SCHEDULER: Downloaded {stats['bytes'] / 1_000_000:.1f} MB; {stats['truncated']} pages stopped early, "
+          f"{stats['refetched']} needed the full page, {stats['unchanged']} unchanged since the last check.")
+    print(f"SCHEDULER: Next checks scheduled against a budget of {settings.SCHEDULER_REQUESTS_PER_HOUR:g} requests/hour "
+          f"(interval scale {scale_hours:.2f}h).")
+    if failures:
+        print("SCHEDULER: Failures by kind: " + ", ".join(f"{kind} {count}" for kind, count in failures.most_common()) + ".")
+    for breaker in breakers():
+        if breaker.is_open:
+            print(f"SCHEDULER: {breaker.domain} is paused until {breaker.retry_at():%H:%M:%S} "
+                  f"(tripped {breaker.trips} times); its listings were rescheduled for then.")
+    print(f"SCHEDULER: Job finished. {stats['checked']} prices saved, {stats['failed']} failed, "
+          f"{stats['deferred']} deferred.")
@@ -32,6 +32,7 @@ class ProductDetails(BaseModel):
 class ErrorResponse(BaseModel):
     url: str
     error: str
+    kind: Optional[str] = None # blocked, timeout, not_found, parse_error, ... (see scrapers/failures.py)
     
     
 class User(BaseModel):
@@ -82,6 +83,29 @@ class PriceHistoryPoint(BaseModel):
     class Config:
         from_attributes = True
 
+class PriceHistoryExportPoint(PriceHistoryPoint):
+    # A run of identical prices: timestamp is when it was first seen
+    id: int
+    last_seen: datetime
+    checks: int
+
+class PriceHistoryExport(BaseModel):
+    points: List[PriceHistoryExportPoint]
+    # Pass as `cursor` to get the next page; None on the last page
+    next_cursor: Optional[str] = None
+
+class PriceRollupResponse(BaseModel):
+    bucket_start: datetime
+    open_price: float
+    close_price: float
+    min_price: float
+    max_price: float
+    avg_price: float
+    price_count: int
+
+    class Config:
+        from_attributes = True
+
 # For the detailed single product view
 class ProductResponse(BaseModel):
     signature: str
@@ -117,4 +141,37 @@ class SingleTrackedProductResponse(BaseModel):
         
 # For simple success/error messages
 class Msg(BaseModel):
-    msg: str
\ No newline at end of file
+    msg: str
+
+
+# --- Status ---
+class ScrapeCacheStats(BaseModel):
+    hits: int
+    misses: int
+    coalesced: int
+    hit_ratio: float
+    entries: int
+    in_flight: int
+
+
+# --- Bulk tracking jobs ---
+class TrackJobError(BaseModel):
+    url: str
+    error: str
+    kind: Optional[str] = None
+
+class TrackJobResponse(BaseModel):
+    id: int
+    status: str
+    total: int
+    processed: int
+    succeeded: int
+    skipped: int
+    failed: int
+    errors: List[TrackJobError] = []
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -1,23 +1,47 @@
 import re
 import json # Import the json library
-from typing import Optional
-from bs4 import BeautifulSoup
-from schemas import ProductDetails, ListingDetails
+from typing import Dict, List
+from .spec import Field, SiteSpec, SpecScraper
 
-class AmazonScraper:
-    def _parse_price(self, text: str) -> Optional[float]:
-        if not text: return None
-        price = re.search(r'[\d,.]+', text)
-        return float(price.group(0).replace(',', '')) if price else None
+_THUMBNAIL_SIZE_RE = re.compile(r'\._AC_US\d+_\.')
 
-    def scrape(self, soup: BeautifulSoup, url: str) -> ProductDetails:
-        # --- Image Scraping (NEW & IMPROVED LOGIC) ---
+class AmazonScraper(SpecScraper):
+    spec = SiteSpec(
+        # --- Listing-specific Details ---
+        price=Field(".a-price-whole"),
+        mrp=Field("span.a-text-price span.a-offscreen"),
+        currency=Field(".a-price-symbol"),
+        rating=Field("#acrPopover .a-icon-alt"),
+        num_ratings=Field("#acrCustomerReviewText"),
+        availability=Field("#availability"),
+        seller=Field("#merchant-info"),
+        # --- Canonical Product Details ---
+        title=Field("#productTitle"),
+        brand=Field("#bylineInfo"),
+        features=Field("#feature-bullets li .a-list-item", many=True),
+        breadcrumbs=Field("#wayfinding-breadcrumbs ul li .a-link-normal", many=True),
+        spec_rows=Field("#productDetails_techSpec_section_1 tr", many=True),
+        # --- Images ---
+        main_image=Field("#imgTagWrapperId img"),
+        gallery_images=Field("#altImages .a-button-thumbnail img", many=True),
+    )
+    # The price block, buy box and seller info all sit in the first part of the page
+    listing_markers = (b'a-price-whole', b'id="availability"', b'id="merchant-info"')
+    fingerprint_markers = (b'a-price-whole', b'a-text-price', b'id="availability"', b'id="merchant-info"')
+    blocked_markers = (b'/errors/validateCaptcha', b'api-services-support@amazon.com')
+    default_currency = "₹"
+    default_seller = "Amazon"
+
+    def clean_brand(self, text: str) -> str:
+        return text.replace('Visit the ', '').replace(' Store', '')
+
+    def image_urls(self, found: Dict[str, list]) -> List[str]:
         image_urls = []
         # Priority 1: Find the main image's high-res data attribute
-        main_image_div = soup.select_one("#imgTagWrapperId img")
-        if main_image_div and 'data-a-dynamic-image' in main_image_div.attrs:
+        main_image_div = self.first(found, "main_image")
+        if main_image_div and main_image_div.attr('data-a-dynamic-image'):
             try:
-                image_data = json.loads(main_image_div['data-a-dynamic-image'])
+                image_data = json.loads(main_image_div.attr('data-a-dynamic-image'))
                 # Get the largest image URL from the dynamic data
                 largest_image_url = max(image_data.keys(), key=lambda u: image_data[u][0])
                 image_urls.append(largest_image_url)
@@ -26,78 +50,10 @@ class AmazonScraper:
 
         # Priority 2: Fallback to the thumbnail gallery if the above fails
         if not image_urls:
-            gallery_elements = soup.select("#altImages .a-button-thumbnail img")
-            for img in gallery_elements:
-                src = img.get('src')
+            for img in found.get("gallery_images", []):
+                src = img.attr('src')
                 if src:
                     # Replace thumbnail size hints with a larger size
-                    high_res_url = re.sub(r'\._AC_US\d+_\.', '._AC_SL1500_.', src)
+                    high_res_url = _THUMBNAIL_SIZE_RE.sub('._AC_SL1500_.', src)
                     image_urls.append(high_res_url)
-
-        # --- The rest of the scraping logic remains the same ---
-        title = soup.select_one("#productTitle")
-        # ... (all other selectors and processing logic remains the same as before) ...
-        # --- Listing-specific Details ---
-        mrp_element = soup.select_one("span.a-text-price span.a-offscreen")
-        price_element = soup.select_one(".a-price-whole")
-        currency_element = soup.select_one(".a-price-symbol")
-        rating_text_element = soup.select_one("#acrPopover .a-icon-alt")
-        num_ratings_element = soup.select_one("#acrCustomerReviewText")
-        availability_element = soup.select_one("#availability")
-        seller_element = soup.select_one("#merchant-info")
-
-        # --- Canonical Product Details ---
-        brand_element = soup.select_one("#bylineInfo")
-        feature_bullets_elements = soup.select("#feature-bullets li .a-list-item")
-        breadcrumbs_elements = soup.select("#wayfinding-breadcrumbs ul li .a-link-normal")
-        spec_table_rows = soup.select("#productDetails_techSpec_section_1 tr")
-
-        # --- Process Listing Details ---
-        price = self._parse_price(price_element.get_text()) if price_element else None
-        mrp = self._parse_price(mrp_element.get_text()) if mrp_element else price
-        
-        avg_rating = 0.0
-        if rating_text_element:
-            rating_match = re.search(r'[\d.]+', rating_text_element.text)
-            if rating_match:
-                avg_rating = float(rating_match.group(0))
-
-        num_ratings = 0
-        if num_ratings_element:
-            ratings_match = re.search(r'[\d,]+', num_ratings_element.text)
-            if ratings_match:
-                num_ratings = int(ratings_match.group(0).replace(',', ''))
-        
-        listing = ListingDetails(
-            url=url, price=price, mrp=mrp,
-            currency=currency_element.text if currency_element else "₹",
-            stock_status=availability_element.get_text(strip=True) if availability_element else "Not Found",
-            seller_name=seller_element.get_text(strip=True) if seller_element else "Amazon",
-            average_rating=avg_rating, num_ratings=num_ratings,
-        )
-
-        # --- Process Canonical Details ---
-        name = title.get_text(strip=True) if title else "Not Found"
-        brand = brand_element.get_text(strip=True).replace('Visit the ', '').replace(' Store', '') if brand_element else "Not Found"
-        
-        key_features = [feat.get_text(strip=True) for feat in feature_bullets_elements]
-        category_path = [crumb.get_text(strip=True) for crumb in breadcrumbs_elements]
-        
-        specifications = {row.th.get_text(strip=True): row.td.get_text(strip=True) for row in spec_table_rows}
-        if 'Brand' in specifications:
-            brand = specifications['Brand']
-
-        # Generate signature
-        signature_str = f"{brand} {name}".lower().strip()
-        signature = re.sub(r'\s+', ' ', signature_str)
-
-        product = ProductDetails(
-            signature=signature, name=name, brand=brand,
-            category_path=category_path,
-            image_urls=image_urls, # Use the new, higher-quality list
-            key_features=key_features,
-            specifications=specifications,
-            listing=listing
-        )
-
-        return product
\ No newline at end of file
+        return image_urls
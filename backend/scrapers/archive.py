@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Iterator, Optional
+
+from core.config import settings
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("The page archive needs the zstandard package.") from e
+    return zstandard
+
+
+class PageArchive:
+    """
+    Content-addressed store of raw fetched pages on local disk. Each distinct body
+    is kept once as a zstd-compressed blob named by its SHA-256; a daily JSONL index
+    records which URL was fetched when, so pages can be re-extracted offline.
+
+        <root>/blobs/ab/cd/abcd...e9.html.zst
+        <root>/index/2025-01-31.jsonl
+    """
+
+    def __init__(self, root: str, level: int = 6):
+        self.root = root
+        self.level = level
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "blobs", digest[:2], digest[2:4], f"{digest}.html.zst")
+
+    def put(self, url: str, body: bytes, fetched_at: datetime, complete: bool = True) -> str:
+        """Stores a fetched page (deduplicated by content) and indexes the fetch. Returns the digest."""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            compressed = _zstd().ZstdCompressor(level=self.level).compress(body)
+            # Write then rename, so readers never see a half-written blob
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+
+        index_dir = os.path.join(self.root, "index")
+        os.makedirs(index_dir, exist_ok=True)
+        record = {"url": url, "sha256": digest, "fetched_at": fetched_at.isoformat(), "complete": complete}
+        with open(os.path.join(index_dir, f"{fetched_at:%Y-%m-%d}.jsonl"), "a") as f:
+            f.write(json.dumps(record) + "\n")
+        return digest
+
+    def read(self, digest: str) -> bytes:
+        with open(self._blob_path(digest), "rb") as f:
+            return _zstd().ZstdDecompressor().decompress(f.read())
+
+    def records(self, since: Optional[datetime] = None, until: Optional[datetime] = None) -> Iterator[dict]:
+        """Yields index records (url, sha256, fetched_at, complete) in [since, until), oldest day first."""
+        index_dir = os.path.join(self.root, "index")
+        if not os.path.isdir(index_dir):
+            return
+        for name in sorted(os.listdir(index_dir)):
+            if since and name[:10] < f"{since:%Y-%m-%d}":
+                continue
+            if until and name[:10] > f"{until:%Y-%m-%d}":
+                continue
+            with open(os.path.join(index_dir, name)) as f:
+                for line in f:
+                    record = json.loads(line)
+                    fetched_at = datetime.fromisoformat(record["fetched_at"])
+                    if (since and fetched_at < since) or (until and fetched_at >= until):
+                        continue
+                    record["fetched_at"] = fetched_at
+                    yield record
+
+
+def get_page_archive() -> Optional[PageArchive]:
+    """The configured archive, or None when PAGE_ARCHIVE_DIR is not set."""
+    if not settings.PAGE_ARCHIVE_DIR:
+        return None
+    return PageArchive(settings.PAGE_ARCHIVE_DIR, settings.PAGE_ARCHIVE_LEVEL)
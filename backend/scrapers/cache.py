@@ -0,0 +1,76 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlightCache:
+    """
+    In-process single-flight layer with a bounded, short-TTL LRU of results.
+    Concurrent callers for the same key share one in-flight call, and results
+    that pass `cacheable` are served from memory until they expire.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, cacheable: Callable[[Any], bool] = lambda result: True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cacheable = cacheable
+        self._entries = OrderedDict() # key -> (expires_at, result)
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _lookup(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: Hashable, result):
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _run(self, key: Hashable, call: Callable[[], Awaitable]):
+        try:
+            result = await call()
+            if self.cacheable(result):
+                self._store(key, result)
+            return result
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def get(self, key: Hashable, call: Callable[[], Awaitable]):
+        entry = self._lookup(key)
+        if entry is not None:
+            self.hits += 1
+            return entry[1]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = self._in_flight[key] = asyncio.ensure_future(self._run(key, call))
+        # Shielded so one caller giving up (e.g. a dropped request) doesn't cancel the shared call
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+            "in_flight": len(self._in_flight),
+        }
@@ -0,0 +1,150 @@
+# Parser engines behind a tiny node API (select_one / select / text / attr), so
+# scrapers are written once and the HTML backend can be picked by config:
+#   "html.parser" - BeautifulSoup with Python's built-in parser (slowest, no extra deps)
+#   "lxml"        - BeautifulSoup on top of the lxml C tree builder
+#   "lexbor"      - selectolax's Lexbor engine, tree building and CSS matching in C
+import re
+from typing import Dict, List, Optional
+
+# The parts of a selector's rightmost compound (e.g. "span.a-offscreen") used to index it
+_COMPOUND_TAG = re.compile(r'^([a-zA-Z][\w-]*)')
+_COMPOUND_ID = re.compile(r'#([\w-]+)')
+_COMPOUND_CLASS = re.compile(r'\.([\w-]+)')
+
+
+def _compile_soup(fields) -> dict:
+    """
+    Compiles every rule with soupsieve and indexes it by the id, class or tag its
+    rightmost compound requires, so a single walk over the tree only runs the
+    full selector match on elements that can possibly match it.
+    """
+    import soupsieve
+
+    index = {"id": {}, "class": {}, "tag": {}, "any": []}
+    for name, field in fields.items():
+        rule = (name, soupsieve.compile(field.selector), field.many)
+        rightmost = re.split(r'[\s>+~]+', field.selector.strip())[-1]
+        id_match, class_match = _COMPOUND_ID.search(rightmost), _COMPOUND_CLASS.search(rightmost)
+        tag_match = _COMPOUND_TAG.match(rightmost)
+        if id_match:
+            index["id"].setdefault(id_match.group(1), []).append(rule)
+        elif class_match:
+            index["class"].setdefault(class_match.group(1), []).append(rule)
+        elif tag_match:
+            index["tag"].setdefault(tag_match.group(1).lower(), []).append(rule)
+        else:
+            index["any"].append(rule)
+    return index
+
+
+class SoupNode:
+    """Node API over a BeautifulSoup tag (used by the html.parser and lxml engines)."""
+    __slots__ = ("_tag",)
+
+    def __init__(self, tag):
+        self._tag = tag
+
+    def select_one(self, css: str) -> Optional["SoupNode"]:
+        found = self._tag.select_one(css)
+        return SoupNode(found) if found is not None else None
+
+    def select(self, css: str) -> List["SoupNode"]:
+        return [SoupNode(found) for found in self._tag.select(css)]
+
+    def text(self, strip: bool = False) -> str:
+        return self._tag.get_text(strip=strip)
+
+    def attr(self, name: str) -> Optional[str]:
+        value = self._tag.get(name)
+        # BeautifulSoup returns multi-valued attributes (class) as lists
+        return " ".join(value) if isinstance(value, list) else value
+
+    def extract(self, spec) -> Dict[str, List["SoupNode"]]:
+        """Fills every field of a SiteSpec in one walk over the tree (matches in document order)."""
+        from bs4 import Tag
+
+        index = spec.compiled("soup", _compile_soup)
+        found = {name: [] for name in spec.fields}
+        done = set() # Single-match fields that already have their match
+        # With only single-match fields the walk can stop as soon as all of them are found
+        stop_when_done = not any(field.many for field in spec.fields.values())
+        for element in self._tag.descendants:
+            if not isinstance(element, Tag):
+                continue
+            candidates = list(index["any"])
+            element_id = element.get("id")
+            if element_id:
+                candidates += index["id"].get(element_id, ())
+            for class_name in element.get("class") or ():
+                candidates += index["class"].get(class_name, ())
+            candidates += index["tag"].get(element.name, ())
+
+            for name, pattern, many in candidates:
+                if name not in done and pattern.match(element):
+                    found[name].append(SoupNode(element))
+                    if not many:
+                        done.add(name)
+            if stop_when_done and len(done) == len(found):
+                break
+        return found
+
+
+class LexborNode:
+    """Node API over a selectolax Lexbor node."""
+    __slots__ = ("_node",)
+
+    def __init__(self, node):
+        self._node = node
+
+    def select_one(self, css: str) -> Optional["LexborNode"]:
+        found = self._node.css_first(css)
+        return LexborNode(found) if found is not None else None
+
+    def select(self, css: str) -> List["LexborNode"]:
+        return [LexborNode(found) for found in self._node.css(css)]
+
+    def text(self, strip: bool = False) -> str:
+        return self._node.text(strip=strip)
+
+    def attr(self, name: str) -> Optional[str]:
+        return self._node.attributes.get(name)
+
+    def extract(self, spec) -> Dict[str, List["LexborNode"]]:
+        """Fills every field of a SiteSpec. Lexbor matches selectors natively, so each rule is one C-level query."""
+        found = {}
+        for name, field in spec.fields.items():
+            if field.many:
+                found[name] = [LexborNode(node) for node in self._node.css(field.selector)]
+            else:
+                node = self._node.css_first(field.selector)
+                found[name] = [LexborNode(node)] if node is not None else []
+        return found
+
+
+def _parse_soup(body: bytes, builder: str) -> SoupNode:
+    from bs4 import BeautifulSoup
+    return SoupNode(BeautifulSoup(body, builder))
+
+
+def _parse_lexbor(body: bytes) -> LexborNode:
+    try:
+        from selectolax.lexbor import LexborHTMLParser
+    except ImportError as e:
+        raise RuntimeError("The 'lexbor' parser engine needs the selectolax package.") from e
+    return LexborNode(LexborHTMLParser(body))
+
+
+ENGINES = {
+    "html.parser": lambda body: _parse_soup(body, "html.parser"),
+    "lxml": lambda body: _parse_soup(body, "lxml"),
+    "lexbor": _parse_lexbor,
+}
+
+
+def parse_document(body: bytes, engine: str = "html.parser"):
+    """Parses a page with the named engine and returns its root node."""
+    try:
+        parse = ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Unknown parser engine '{engine}'. Choose one of: {', '.join(ENGINES)}")
+    return parse(body)
@@ -1,10 +1,24 @@
-import httpx
-from bs4 import BeautifulSoup
+import asyncio
+from datetime import datetime
+from typing import Optional
 from urllib.parse import urlparse
 
+from core.config import settings
 from schemas import ErrorResponse
 # Import the new, modular scraper classes
 from .amazon import AmazonScraper
+from .archive import get_page_archive
+from .cache import SingleFlightCache
+from .engines import parse_document
+from .failures import (
+    FAILURE_CIRCUIT_OPEN, FAILURE_PARSE_ERROR, FAILURE_UNSUPPORTED, RETRYABLE_FAILURES,
+    CircuitBreaker, ScrapeBlocked, ScrapeFailure, classify_failure, retry_delay,
+)
+from .fingerprints import page_digest
+from .http_client import get_http_client, host_slot
+from .parse_pool import run_parser
+from .spec import PROFILE_FULL, PROFILE_LISTING
+from .urls import canonicalize_url
 
 class ScraperFactory:
     def __init__(self):
@@ -12,48 +26,256 @@ class ScraperFactory:
             "www.amazon.in": AmazonScraper(),
             "www.amazon.com": AmazonScraper(),
         }
+        # One breaker per domain, shared by every caller in the process
+        self._breakers = {domain: CircuitBreaker(domain) for domain in self._scrapers}
 
     def get_scraper(self, url: str):
         domain = urlparse(url).netloc
         return self._scrapers.get(domain)
 
-# The single entry point for all scraping tasks
-async def scrape_url(url: str):
-    factory = ScraperFactory()
-    scraper = factory.get_scraper(url)
-    
-    if not scraper:
-        return ErrorResponse(url=url, error="No scraper available for this website.")
-
-    headers = {
-        'authority': urlparse(url).netloc,
-        'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-        'accept-language': 'en-US,en;q=0.9',
-        'sec-ch-ua': '"Google Chrome";v="117", "Not;A=Brand";v="8", "Chromium";v="117"',
-        'sec-ch-ua-mobile': '?0',
-        'sec-ch-ua-platform': '"Windows"',
-        'sec-fetch-dest': 'document',
-        'sec-fetch-mode': 'navigate',
-        'sec-fetch-site': 'none',
-        'sec-fetch-user': '?1',
-        'upgrade-insecure-requests': '1',
-        'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36',
-    }
+    def get_breaker(self, url: str) -> Optional[CircuitBreaker]:
+        return self._breakers.get(urlparse(url).netloc)
 
-    try:
-        async with httpx.AsyncClient(http2=True, trust_env=False) as client:
-            resp = await client.get(url, headers=headers, follow_redirects=True, timeout=20.0)
+    def domains(self):
+        return list(self._scrapers)
+
+# Scrapers are stateless, so one factory is shared by every call
+_factory = ScraperFactory()
+
+def supported_domains():
+    """Domains that have a registered scraper."""
+    return _factory.domains()
+
+def get_breaker(url: str) -> Optional[CircuitBreaker]:
+    """The circuit breaker of the URL's domain (None for unsupported sites)."""
+    return _factory.get_breaker(url)
+
+def breakers():
+    """Every domain's circuit breaker."""
+    return [_factory.get_breaker(f"https://{domain}/") for domain in _factory.domains()]
+
+
+def _check_blocked(url: str, body: bytes):
+    """Raises ScrapeBlocked if a 200 response is really the site's captcha page."""
+    scraper = _factory.get_scraper(url)
+    if any(marker in body for marker in getattr(scraper, "blocked_markers", ())):
+        raise ScrapeBlocked("Blocked (captcha/bot challenge page).")
+
+
+async def _with_retries(url: str, fetch):
+    """
+    Runs `fetch()` behind the domain's circuit breaker, retrying transient
+    failures with exponential backoff and jitter. Every failure comes out as a
+    classified ScrapeFailure; a refused call raises one with kind circuit_open.
+    """
+    breaker = _factory.get_breaker(url)
+    attempt = 0
+    while True:
+        if breaker is not None and not breaker.acquire():
+            raise ScrapeFailure(FAILURE_CIRCUIT_OPEN, f"{breaker.domain} is paused after repeated failures.")
+        try:
+            result = await fetch()
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.release_probe()
+            raise
+        except Exception as e:
+            kind = classify_failure(e)
+            if breaker is not None:
+                breaker.record_failure(kind)
+            if kind not in RETRYABLE_FAILURES or attempt >= settings.SCRAPE_RETRY_ATTEMPTS:
+                if isinstance(e, ScrapeFailure):
+                    raise
+                raise ScrapeFailure(kind, str(e)) from e
+            await asyncio.sleep(retry_delay(attempt))
+            attempt += 1
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+
+async def _fetch_page_once(url: str) -> bytes:
+    headers = {'authority': urlparse(url).netloc}
+    client = get_http_client()
+    async with host_slot(url):
+        resp = await client.get(url, headers=headers)
+    resp.raise_for_status()
+
+    if resp.status_code != 200:
+        raise ScrapeBlocked(f"Blocked (possible captcha/bot challenge). Status: {resp.status_code}")
+    _check_blocked(url, resp.content)
+    return resp.content
+
+
+async def fetch_page(url: str) -> bytes:
+    """
+    Downloads a product page through the shared client and returns the raw body.
+    Transient failures are retried; see _with_retries.
+    """
+    return await _with_retries(url, lambda: _fetch_page_once(url))
+
+
+class FetchedPage:
+    """A (possibly partial) page from fetch_listing_page plus its cache validators."""
+    __slots__ = ("body", "complete", "not_modified", "etag", "last_modified")
+
+    def __init__(self, body: Optional[bytes] = None, complete: bool = True, not_modified: bool = False,
+                 etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self.body = body
+        self.complete = complete
+        self.not_modified = not_modified
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+async def fetch_listing_page(url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> FetchedPage:
+    """
+    Streams a product page and stops reading once the scraper's listing markers
+    have all been seen (plus some slack to close the elements), or once the byte
+    budget is used up. An incomplete body is usually enough for the listing
+    profile, and callers fall back to fetch_page if not.
+
+    Sends If-None-Match / If-Modified-Since when validators from a previous fetch
+    are given; a 304 comes back as FetchedPage(not_modified=True). Transient
+    failures are retried; see _with_retries.
+    """
+    return await _with_retries(url, lambda: _fetch_listing_page_once(url, etag, last_modified))
+
+
+async def _fetch_listing_page_once(url: str, etag: Optional[str], last_modified: Optional[str]) -> FetchedPage:
+    scraper = _factory.get_scraper(url)
+    markers = getattr(scraper, "listing_markers", ()) if settings.SCRAPE_STREAM_ENABLED else ()
+
+    headers = {'authority': urlparse(url).netloc}
+    if etag:
+        headers['if-none-match'] = etag
+    if last_modified:
+        headers['if-modified-since'] = last_modified
+
+    client = get_http_client()
+    pending = set(markers)
+    overlap = max((len(marker) for marker in markers), default=0) # Markers may straddle two chunks
+    chunks, size, tail, stop_at = [], 0, b"", None
+    async with host_slot(url):
+        async with client.stream("GET", url, headers=headers) as resp:
+            page = FetchedPage(etag=resp.headers.get('etag'), last_modified=resp.headers.get('last-modified'))
+            if resp.status_code == 304:
+                page.not_modified = True
+                return page
             resp.raise_for_status()
-            
             if resp.status_code != 200:
-                return ErrorResponse(url=url, error=f"Blocked (possible captcha/bot challenge). Status: {resp.status_code}")
+                raise ScrapeBlocked(f"Blocked (possible captcha/bot challenge). Status: {resp.status_code}")
+
+            async for chunk in resp.aiter_bytes():
+                chunks.append(chunk)
+                size += len(chunk)
+                if pending:
+                    window = tail + chunk
+                    pending = {marker for marker in pending if marker not in window}
+                    tail = window[-overlap:]
+                    if not pending:
+                        stop_at = size + settings.SCRAPE_STREAM_SLACK_BYTES
+                if markers and ((stop_at is not None and size >= stop_at) or size >= settings.SCRAPE_STREAM_BYTE_BUDGET):
+                    # Leaving the block closes the stream; the rest of the page is never downloaded
+                    page.body, page.complete = b"".join(chunks), False
+                    break
+    if page.body is None:
+        page.body = b"".join(chunks)
+    _check_blocked(url, page.body)
+    return page
+
+
+def fingerprint_page(url: str, body: bytes) -> Optional[str]:
+    """Digest of the parts of the page the scraper's listing depends on (see fingerprints.page_digest)."""
+    scraper = _factory.get_scraper(url)
+    return page_digest(body, getattr(scraper, "fingerprint_markers", ()))
 
-            soup = BeautifulSoup(resp.text, "html.parser")
-            product = scraper.scrape(soup, url)
 
-            # If essential fields are missing, you can implement discovery logic per-scraper if/when needed.
+async def archive_page(url: str, body: bytes, fetched_at: datetime, complete: bool = True):
+    """Stores a fetched page in the raw HTML archive, if PAGE_ARCHIVE_DIR is set. Never fails the scrape."""
+    archive = get_page_archive()
+    if archive is None or not body:
+        return
+    try:
+        await asyncio.to_thread(archive.put, url, body, fetched_at, complete)
+    except Exception as e:
+        print(f"ARCHIVE: Could not store {url}: {e}")
+
+
+def parse_page(url: str, body: bytes, profile: str = PROFILE_FULL):
+    """
+    Runs the site's scraper over an already fetched page and returns
+    ProductDetails (full profile) or ListingDetails (listing profile).
+    CPU-bound, so callers on the event loop should go through parse_pool.run_parser.
+    """
+    scraper = _factory.get_scraper(url)
+    if not scraper:
+        raise ValueError("No scraper available for this website.")
+    soup = parse_document(body, settings.SCRAPER_PARSER_ENGINE)
+    return scraper.scrape(soup, url, profile)
+
+
+async def _scrape(url: str, profile: str):
+    scraper = _factory.get_scraper(url)
+    
+    if not scraper:
+        return ErrorResponse(url=url, error="No scraper available for this website.", kind=FAILURE_UNSUPPORTED)
 
-            return product
+    try:
+        body = await fetch_page(url)
+    except ScrapeFailure as e:
+        return ErrorResponse(url=url, error=f"Failed to scrape. Reason: {str(e)}", kind=e.kind)
+    await archive_page(url, body, datetime.now())
 
+    try:
+        product = await run_parser(parse_page, url, body, profile)
     except Exception as e:
-        return ErrorResponse(url=url, error=f"Failed to scrape. Reason: {str(e)}")
\ No newline at end of file
+        return ErrorResponse(url=url, error=f"Failed to parse the page. Reason: {str(e)}", kind=FAILURE_PARSE_ERROR)
+
+    # If essential fields are missing, you can implement discovery logic per-scraper if/when needed.
+
+    return product
+
+
+# Concurrent scrapes of the same listing share one fetch, and successful results are
+# reused for a short while, so a burst of /track calls costs one upstream request
+scrape_cache = SingleFlightCache(
+    max_entries=settings.SCRAPE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SCRAPE_CACHE_TTL_SECONDS,
+    cacheable=lambda result: not isinstance(result, ErrorResponse),
+)
+
+# The single entry point for all scraping tasks
+async def scrape_url(url: str, profile: str = PROFILE_FULL):
+    # Every link to the same listing is scraped (and cached) as its canonical URL
+    canonical_url = canonicalize_url(url)
+    return await scrape_cache.get((canonical_url, profile), lambda: _scrape(canonical_url, profile))
+
+
+async def scrape_many(urls, concurrency: int, profile: str = PROFILE_FULL):
+    """
+    Scrapes `urls` with at most `concurrency` in flight, yielding (index, result)
+    pairs in completion order. Closing the generator early cancels whatever is
+    still running.
+    """
+    pending = {} # task -> index into urls
+    queued = iter(enumerate(urls))
+
+    def start_next():
+        for index, url in queued:
+            pending[asyncio.ensure_future(scrape_url(url, profile))] = index
+            return
+
+    try:
+        for _ in range(max(concurrency, 1)):
+            start_next()
+        while pending:
+            finished, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                index = pending.pop(task)
+                start_next()
+                yield index, task.result()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,143 @@
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+import httpx
+
+from core.config import settings
+
+# Failure kinds, as reported in ErrorResponse.kind
+FAILURE_BLOCKED = "blocked"            # Captcha/bot challenge, 403, 429 or 503
+FAILURE_TIMEOUT = "timeout"
+FAILURE_NETWORK = "network"            # Connection refused/reset, DNS, protocol errors
+FAILURE_SERVER_ERROR = "server_error"  # Other 5xx
+FAILURE_NOT_FOUND = "not_found"        # 404/410: the listing is gone
+FAILURE_HTTP_ERROR = "http_error"      # Any other unexpected status
+FAILURE_PARSE_ERROR = "parse_error"    # The page came back but the scraper failed on it
+FAILURE_UNSUPPORTED = "unsupported"    # No scraper for the site
+FAILURE_CIRCUIT_OPEN = "circuit_open"  # Not attempted: the domain's breaker is open
+
+# Worth retrying the same request after a short wait
+RETRYABLE_FAILURES = {FAILURE_TIMEOUT, FAILURE_NETWORK, FAILURE_SERVER_ERROR}
+# Signs the site is pushing back; enough of them in a row open the domain's breaker
+BREAKER_FAILURES = {FAILURE_BLOCKED, FAILURE_TIMEOUT, FAILURE_NETWORK, FAILURE_SERVER_ERROR}
+
+_BLOCKED_STATUSES = {403, 429, 503}
+
+
+class ScrapeFailure(Exception):
+    """A classified scrape failure; `kind` is one of the FAILURE_* constants."""
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(message)
+        self.kind = kind
+
+
+class ScrapeBlocked(ScrapeFailure):
+    """The site answered, but not with the product page (captcha/bot challenge)."""
+
+    def __init__(self, message: str):
+        super().__init__(FAILURE_BLOCKED, message)
+
+
+def classify_failure(exc: BaseException) -> str:
+    """Maps an exception raised while fetching a page to a FAILURE_* kind."""
+    if isinstance(exc, ScrapeFailure):
+        return exc.kind
+    if isinstance(exc, httpx.TimeoutException):
+        return FAILURE_TIMEOUT
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        if status in _BLOCKED_STATUSES:
+            return FAILURE_BLOCKED
+        if status in (404, 410):
+            return FAILURE_NOT_FOUND
+        if status >= 500:
+            return FAILURE_SERVER_ERROR
+        return FAILURE_HTTP_ERROR
+    if isinstance(exc, httpx.TransportError):
+        return FAILURE_NETWORK
+    return FAILURE_HTTP_ERROR
+
+
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter: a random wait of up to base * 2**attempt, capped."""
+    cap = min(settings.SCRAPE_RETRY_MAX_SECONDS, settings.SCRAPE_RETRY_BASE_SECONDS * 2 ** attempt)
+    return random.uniform(0, cap)
+
+
+class CircuitBreaker:
+    """
+    Per-domain circuit breaker. SCRAPE_BREAKER_THRESHOLD breaker failures in a
+    row open it: requests to the domain are refused for a cool-down that doubles
+    with every trip that follows a failed probe (up to SCRAPE_BREAKER_MAX_OPEN_SECONDS).
+    After the cool-down one probe request is let through; if the site answers it
+    (even with a 404 or another non-breaker failure) the breaker closes, if it
+    fails with a breaker failure the breaker opens again.
+    """
+
+    def __init__(self, domain: str):
+        self.domain = domain
+        self.failures = 0
+        self.trips = 0
+        self.opened_at: Optional[float] = None
+        self.open_seconds = settings.SCRAPE_BREAKER_OPEN_SECONDS
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def _cooling_down(self) -> bool:
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.open_seconds
+
+    def available(self) -> bool:
+        """Whether a request would be let through right now (does not take the probe)."""
+        return not self.is_open or (not self._cooling_down() and not self._probing)
+
+    def acquire(self) -> bool:
+        """Lets a request through if the breaker allows it; a half-open breaker lets through one probe."""
+        if not self.available():
+            return False
+        if self.is_open:
+            self._probing = True
+        return True
+
+    def release_probe(self):
+        """Gives the probe back without an outcome (e.g. the request was cancelled)."""
+        self._probing = False
+
+    def record_success(self):
+        if self.is_open:
+            print(f"BREAKER: {self.domain} recovered, closing the circuit.")
+        self.failures = 0
+        self.opened_at = None
+        self.open_seconds = settings.SCRAPE_BREAKER_OPEN_SECONDS
+        self._probing = False
+
+    def record_failure(self, kind: str):
+        if kind not in BREAKER_FAILURES:
+            # The site answered (e.g. a 404 for a listing that is gone), so a probe still proves it is back
+            if self._probing:
+                self.record_success()
+            return
+        self.failures += 1
+        if self._probing:
+            # The probe failed: stay open, and wait longer before the next one
+            self._probing = False
+            self.open_seconds = min(self.open_seconds * 2, settings.SCRAPE_BREAKER_MAX_OPEN_SECONDS)
+            self.opened_at = time.monotonic()
+            print(f"BREAKER: Probe to {self.domain} failed ({kind}); open for another {self.open_seconds:.0f}s.")
+        elif not self.is_open and self.failures >= settings.SCRAPE_BREAKER_THRESHOLD:
+            self.trips += 1
+            self.opened_at = time.monotonic()
+            print(f"BREAKER: {self.failures} failures in a row from {self.domain} (last: {kind}); "
+                  f"pausing it for {self.open_seconds:.0f}s.")
+
+    def retry_at(self) -> datetime:
+        """Wall-clock time at which the breaker will let a probe through."""
+        if not self.is_open:
+            return datetime.now()
+        remaining = max(self.open_seconds - (time.monotonic() - self.opened_at), 0)
+        return datetime.now() + timedelta(seconds=remaining)
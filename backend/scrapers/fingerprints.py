@@ -0,0 +1,72 @@
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+from core.config import settings
+from schemas import ListingDetails
+
+
+class PageFingerprint:
+    """What we saw the last time a URL was checked."""
+    __slots__ = ("digest", "etag", "last_modified", "listing")
+
+    def __init__(self, digest: Optional[str], etag: Optional[str], last_modified: Optional[str], listing: ListingDetails):
+        self.digest = digest
+        self.etag = etag
+        self.last_modified = last_modified
+        self.listing = listing
+
+
+class FingerprintStore:
+    """
+    Bounded, in-process LRU of per-URL fingerprints. It lives as long as the
+    scheduler process, so each run can skip re-parsing listings whose page (or
+    price region) hasn't changed since the previous run.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, url: str) -> Optional[PageFingerprint]:
+        fingerprint = self._entries.get(url)
+        if fingerprint is not None:
+            self._entries.move_to_end(url)
+        return fingerprint
+
+    def put(self, url: str, fingerprint: PageFingerprint):
+        if self.max_entries <= 0:
+            return
+        self._entries[url] = fingerprint
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def page_digest(body: bytes, markers=(), window: int = 512) -> Optional[str]:
+    """
+    Hashes what matters on a page. With markers, only the `window` bytes after
+    each marker are hashed (the price, stock and seller snippets), so per-request
+    noise elsewhere on the page (tokens, ads, recommendations) doesn't count as a
+    change. Without markers the whole body is hashed. Returns None if none of the
+    markers are on the page.
+    """
+    if not markers:
+        return hashlib.sha256(body).hexdigest()
+
+    digest = hashlib.sha256()
+    found = False
+    for marker in markers:
+        position = body.find(marker)
+        if position >= 0:
+            found = True
+            digest.update(body[position:position + len(marker) + window])
+        digest.update(b"\0") # Keeps "marker missing" distinct from an empty snippet
+    return digest.hexdigest() if found else None
+
+
+# Shared by every price-check run in this process
+page_fingerprints = FingerprintStore(settings.PAGE_FINGERPRINT_CACHE_SIZE)
@@ -0,0 +1,83 @@
+import asyncio
+from contextlib import asynccontextmanager
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from core.config import settings
+
+# Browser-like headers sent with every scrape request
+DEFAULT_HEADERS = {
+    'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+    'accept-language': 'en-US,en;q=0.9',
+    'sec-ch-ua': '"Google Chrome";v="117", "Not;A=Brand";v="8", "Chromium";v="117"',
+    'sec-ch-ua-mobile': '?0',
+    'sec-ch-ua-platform': '"Windows"',
+    'sec-fetch-dest': 'document',
+    'sec-fetch-mode': 'navigate',
+    'sec-fetch-site': 'none',
+    'sec-fetch-user': '?1',
+    'upgrade-insecure-requests': '1',
+    'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36',
+}
+
+# One client per process, shared by every scrape so connections (and HTTP/2
+# multiplexing) are reused instead of paying a new TCP+TLS handshake per URL.
+_client: Optional[httpx.AsyncClient] = None
+_host_slots: Dict[str, asyncio.Semaphore] = {}
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(
+        http2=True,
+        trust_env=False,
+        limits=limits,
+        timeout=settings.HTTP_TIMEOUT,
+        headers=DEFAULT_HEADERS,
+        follow_redirects=True,
+        # Don't carry cookies from one check to the next (same as the old per-request client)
+        cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+    )
+
+
+async def start_http_client() -> httpx.AsyncClient:
+    """Creates the shared client. Call once on process startup."""
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+async def close_http_client():
+    """Closes the shared client and its pooled connections. Call on shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _host_slots.clear()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the shared client, creating it lazily for scripts that never called start_http_client()."""
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+@asynccontextmanager
+async def host_slot(url: str):
+    """Caps the number of requests in flight to a single host."""
+    host = urlparse(url).netloc
+    slot = _host_slots.get(host)
+    if slot is None:
+        slot = _host_slots.setdefault(host, asyncio.Semaphore(settings.HTTP_MAX_CONNECTIONS_PER_HOST))
+    async with slot:
+        yield
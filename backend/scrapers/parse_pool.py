@@ -0,0 +1,50 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from core.config import settings
+
+# HTML parsing is pure CPU work; running it in worker processes keeps the event
+# loop (and every other fetch or API request on it) responsive, and uses all cores.
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _pool_size() -> int:
+    if settings.SCRAPE_PARSE_WORKERS is None:
+        return os.cpu_count() or 1
+    return settings.SCRAPE_PARSE_WORKERS
+
+
+def parse_concurrency() -> int:
+    """How many pages can usefully be parsed at the same time."""
+    return max(_pool_size(), 1)
+
+
+def start_parse_pool():
+    """Creates the worker pool. Call once on process startup."""
+    global _pool
+    if _pool is None and _pool_size() > 0:
+        # "spawn" because the parent already runs threads (DB writes, the event loop)
+        _pool = ProcessPoolExecutor(max_workers=_pool_size(), mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def close_parse_pool():
+    """Stops the worker processes. Call on shutdown."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+async def run_parser(func, *args):
+    """
+    Runs a parse function (a picklable, module-level callable) in the pool.
+    With SCRAPE_PARSE_WORKERS=0 it runs inline instead, which is handy for scripts and debugging.
+    """
+    pool = start_parse_pool()
+    if pool is None:
+        return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
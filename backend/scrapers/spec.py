@@ -0,0 +1,164 @@
+import re
+from typing import Dict, List, Optional
+
+from schemas import ProductDetails, ListingDetails
+
+_NUMBER_RE = re.compile(r'[\d,.]+')
+_RATING_RE = re.compile(r'[\d.]+')
+_COUNT_RE = re.compile(r'[\d,]+')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Scrape profiles: "full" extracts the canonical product and its listing (used when a
+# product is first tracked); "listing" only extracts the volatile listing fields, which
+# is all the recurring price check needs.
+PROFILE_FULL = "full"
+PROFILE_LISTING = "listing"
+LISTING_FIELDS = ("price", "mrp", "currency", "rating", "num_ratings", "availability", "seller")
+
+
+class Field:
+    """One extraction rule: a CSS selector, and whether the first match or every match is wanted."""
+    __slots__ = ("selector", "many")
+
+    def __init__(self, selector: str, many: bool = False):
+        self.selector = selector
+        self.many = many
+
+
+class SiteSpec:
+    """
+    The declarative extraction rules for one site. Engines compile the rules
+    once (see `compiled`) and fill every field from a single pass over the page.
+    """
+
+    def __init__(self, **fields: Field):
+        self.fields = fields
+        self._compiled = {}
+        self._subsets = {}
+
+    def only(self, names) -> "SiteSpec":
+        """A spec restricted to the given fields (cached, so it is compiled only once too)."""
+        key = tuple(names)
+        if key not in self._subsets:
+            self._subsets[key] = SiteSpec(**{name: self.fields[name] for name in key if name in self.fields})
+        return self._subsets[key]
+
+    def compiled(self, engine: str, compiler):
+        """Returns the rules compiled for `engine`, compiling them on first use."""
+        if engine not in self._compiled:
+            self._compiled[engine] = compiler(self.fields)
+        return self._compiled[engine]
+
+
+class SpecScraper:
+    """
+    Base class for scrapers declared as a SiteSpec. Subclasses set `spec` with
+    the standard field names below and override the hooks that differ per site.
+
+    Listing fields: price, mrp, currency, rating, num_ratings, availability, seller
+    Product fields: title, brand, features, breadcrumbs, spec_rows, images
+    """
+    spec: SiteSpec
+    # Byte strings that, once all seen, mean the listing fields are in the part of
+    # the page downloaded so far (see factory.fetch_listing_page). Empty = always read it all.
+    listing_markers = ()
+    # Byte strings whose surroundings hold the volatile listing values; only those
+    # snippets are hashed to decide whether a page changed (see fingerprints.page_digest).
+    # Empty = hash the whole body.
+    fingerprint_markers = ()
+    # Byte strings that only appear on the site's captcha/bot-challenge page
+    blocked_markers = ()
+    default_currency = "INR"
+    default_seller = "Not Found"
+
+    # --- Hooks ---
+
+    def parse_price(self, text: str) -> Optional[float]:
+        if not text: return None
+        price = _NUMBER_RE.search(text)
+        return float(price.group(0).replace(',', '')) if price else None
+
+    def clean_brand(self, text: str) -> str:
+        return text
+
+    def image_urls(self, found: Dict[str, list]) -> List[str]:
+        return [src for src in (img.attr('src') for img in found.get("images", [])) if src]
+
+    # --- Extraction ---
+
+    @staticmethod
+    def first(found: Dict[str, list], name: str):
+        nodes = found.get(name)
+        return nodes[0] if nodes else None
+
+    def scrape(self, soup, url: str, profile: str = PROFILE_FULL):
+        """
+        Returns ProductDetails for the full profile, or just the ListingDetails for
+        the listing profile. `soup` is the root node from scrapers.engines.parse_document.
+        """
+        if profile == PROFILE_LISTING:
+            return self.build_listing(soup.extract(self.spec.only(LISTING_FIELDS)), url)
+
+        found = soup.extract(self.spec)
+        listing = self.build_listing(found, url)
+
+        title = self.first(found, "title")
+        brand_element = self.first(found, "brand")
+        name = title.text(strip=True) if title else "Not Found"
+        brand = self.clean_brand(brand_element.text(strip=True)) if brand_element else "Not Found"
+
+        key_features = [feat.text(strip=True) for feat in found.get("features", [])]
+        category_path = [crumb.text(strip=True) for crumb in found.get("breadcrumbs", [])]
+
+        specifications = {}
+        for row in found.get("spec_rows", []):
+            header, value = row.select_one("th"), row.select_one("td")
+            if header and value:
+                specifications[header.text(strip=True)] = value.text(strip=True)
+        if 'Brand' in specifications:
+            brand = specifications['Brand']
+
+        # Generate signature
+        signature_str = f"{brand} {name}".lower().strip()
+        signature = _WHITESPACE_RE.sub(' ', signature_str)
+
+        return ProductDetails(
+            signature=signature, name=name, brand=brand,
+            category_path=category_path,
+            image_urls=self.image_urls(found),
+            key_features=key_features,
+            specifications=specifications,
+            listing=listing
+        )
+
+    def build_listing(self, found: Dict[str, list], url: str) -> ListingDetails:
+        price_element = self.first(found, "price")
+        mrp_element = self.first(found, "mrp")
+        currency_element = self.first(found, "currency")
+        rating_text_element = self.first(found, "rating")
+        num_ratings_element = self.first(found, "num_ratings")
+        availability_element = self.first(found, "availability")
+        seller_element = self.first(found, "seller")
+
+        price = self.parse_price(price_element.text()) if price_element else None
+        mrp = self.parse_price(mrp_element.text()) if mrp_element else price
+
+        avg_rating = 0.0
+        if rating_text_element:
+            rating_match = _RATING_RE.search(rating_text_element.text())
+            if rating_match:
+                avg_rating = float(rating_match.group(0))
+
+        num_ratings = 0
+        if num_ratings_element:
+            ratings_match = _COUNT_RE.search(num_ratings_element.text())
+            if ratings_match:
+                num_ratings = int(ratings_match.group(0).replace(',', ''))
+
+        return ListingDetails(
+            url=url, price=price, mrp=mrp,
+            currency=currency_element.text() if currency_element else self.default_currency,
+            stock_status=availability_element.text(strip=True) if availability_element else "Not Found",
+            seller_name=seller_element.text(strip=True) if seller_element else self.default_seller,
+            average_rating=avg_rating, num_ratings=num_ratings,
+        )
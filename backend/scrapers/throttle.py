@@ -0,0 +1,118 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+from core.config import settings
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return # Rate limiting disabled
+        # The lock keeps waiters in FIFO order while one of them sleeps for the next token
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class DomainLimiter:
+    """Max in-flight requests plus a requests-per-second budget for one domain."""
+
+    def __init__(self, domain: str, max_in_flight: int, requests_per_second: float):
+        self.domain = domain
+        self.max_in_flight = max_in_flight
+        self.requests_per_second = requests_per_second
+        self._slots = asyncio.Semaphore(max_in_flight)
+        # No burst allowance: requests are spread evenly to stay under the radar
+        self._bucket = TokenBucket(requests_per_second, capacity=1)
+
+        # Throughput stats
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.first_started: Optional[float] = None
+        self.last_finished: Optional[float] = None
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self._slots:
+            await self._bucket.acquire()
+            if self.first_started is None:
+                self.first_started = time.monotonic()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+                self.requests += 1
+                self.last_finished = time.monotonic()
+
+    def throughput(self) -> float:
+        """Achieved requests per second between the first start and the last finish."""
+        if not self.requests or self.first_started is None:
+            return 0.0
+        elapsed = self.last_finished - self.first_started
+        return self.requests / elapsed if elapsed > 0 else float(self.requests)
+
+
+class DomainThrottle:
+    """
+    Per-domain scheduler for outbound scrape requests. Each domain gets its own
+    concurrency cap and token bucket; URLs for unknown domains pass straight through.
+    """
+
+    def __init__(self, limiters: Dict[str, DomainLimiter]):
+        self._limiters = limiters
+
+    @classmethod
+    def from_settings(cls, domains: Iterable[str]) -> "DomainThrottle":
+        limiters = {}
+        for domain in domains:
+            overrides = settings.SCRAPE_DOMAIN_LIMITS.get(domain, {})
+            limiters[domain] = DomainLimiter(
+                domain,
+                max_in_flight=int(overrides.get("max_in_flight", settings.SCRAPE_DOMAIN_MAX_IN_FLIGHT)),
+                requests_per_second=float(overrides.get("requests_per_second", settings.SCRAPE_DOMAIN_REQUESTS_PER_SECOND)),
+            )
+        return cls(limiters)
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        limiter = self._limiters.get(urlparse(url).netloc)
+        if limiter is None:
+            yield
+            return
+        async with limiter.slot():
+            yield
+
+    def report(self) -> Dict[str, dict]:
+        """Achieved throughput per domain, for tuning the limits."""
+        return {
+            domain: {
+                "requests": limiter.requests,
+                "requests_per_second": round(limiter.throughput(), 2),
+                "peak_in_flight": limiter.peak_in_flight,
+                "max_in_flight": limiter.max_in_flight,
+                "rate_limit": limiter.requests_per_second,
+            }
+            for domain, limiter in self._limiters.items()
+            if limiter.requests
+        }
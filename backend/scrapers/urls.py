@@ -0,0 +1,34 @@
+import re
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+_AMAZON_HOST = re.compile(r"^(?:www\.)?amazon\.[a-z.]+$")
+# Amazon product pages carry the ASIN in one of these path shapes, e.g.
+# /Sony-WH-1000XM5/dp/B09XS7JWHH/ref=sr_1_1 or /gp/product/B09XS7JWHH
+_AMAZON_ASIN = re.compile(r"/(?:dp|gp/product|gp/aw/d|exec/obidos/asin|o/asin)/([A-Z0-9]{10})(?:[/?]|$)", re.IGNORECASE)
+
+# Query parameters that only say where a click came from
+_TRACKING_PARAMS = {"ref", "ref_", "tag", "fbclid", "gclid", "dclid", "msclkid", "igshid", "mc_cid", "mc_eid"}
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalizes a product URL so every link to the same listing maps to one key.
+    Amazon URLs collapse to https://www.amazon.<tld>/dp/<ASIN>; other URLs get a
+    lower-cased host, no fragment, no tracking parameters and sorted query args.
+    """
+    parts = urlparse(url.strip())
+    host = parts.netloc.lower()
+
+    if _AMAZON_HOST.match(host):
+        match = _AMAZON_ASIN.search(parts.path)
+        if match:
+            if not host.startswith("www."):
+                host = "www." + host
+            return f"https://{host}/dp/{match.group(1).upper()}"
+
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in _TRACKING_PARAMS and not key.lower().startswith(("utm_", "pf_rd_", "pd_rd_"))
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urlunparse((parts.scheme.lower() or "https", host, path, "", urlencode(sorted(query)), ""))
@@ -9,9 +9,11 @@ from db.session import SessionLocal
 import models.product as product_model
 import models.price_history as price_history_model
 import models.user as user_model # <-- ADD THIS LINE
+import models.price_rollup
+import crud_operations
 
 # --- SCRIPT CONFIGURATION ---
-# The ID of the item in your 'tracked_products' table you want to add history to.
+# The ID of the item in your 'tracked_products' table whose listing you want to add history to.
 # This is usually 1 if it's the first item you added.
 TARGET_TRACKED_PRODUCT_ID = 9
 NUMBER_OF_DAYS = 60 # How many days of history to generate
@@ -48,15 +50,17 @@ def seed_price_history():
 
             # Create the new history record
             history_record = price_history_model.PriceHistory(
-                tracked_product_id=tracked_product.id,
+                listing_id=tracked_product.listing_id,
                 price=new_price,
-                timestamp=new_timestamp
+                timestamp=new_timestamp,
+                last_seen=new_timestamp
             )
             db.add(history_record)
 
         # 3. Commit all the new records to the database
         db.commit()
         print(f"Successfully added {NUMBER_OF_DAYS} price history records.")
+        crud_operations.rebuild_price_rollups(db, [tracked_product.listing_id])
 
     finally:
         db.close()
@@ -0,0 +1,8 @@
+import os
+
+# Settings are read at import time. Tests never use the configured database: the
+# ones that need Postgres run against TEST_DATABASE_URL and are skipped without it.
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL", "postgresql://localhost/unconfigured")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
@@ -0,0 +1,61 @@
+# State transitions of the per-domain circuit breaker (scrapers/failures.py).
+import pytest
+
+from core.config import settings
+from scrapers.failures import (
+    FAILURE_HTTP_ERROR, FAILURE_NOT_FOUND, FAILURE_SERVER_ERROR, FAILURE_TIMEOUT, CircuitBreaker,
+)
+
+
+def _tripped() -> CircuitBreaker:
+    breaker = CircuitBreaker("www.amazon.in")
+    for _ in range(settings.SCRAPE_BREAKER_THRESHOLD):
+        assert breaker.acquire()
+        breaker.record_failure(FAILURE_TIMEOUT)
+    assert breaker.is_open and not breaker.acquire()
+    return breaker
+
+
+def _cool_down(breaker: CircuitBreaker):
+    breaker.opened_at -= breaker.open_seconds
+
+
+def test_threshold_opens_the_breaker():
+    _tripped()
+
+
+def test_successful_probe_closes_the_breaker():
+    breaker = _tripped()
+    _cool_down(breaker)
+    assert breaker.acquire()
+    assert not breaker.acquire() # One probe at a time
+    breaker.record_success()
+    assert not breaker.is_open and breaker.acquire()
+
+
+def test_failed_probe_reopens_for_longer():
+    breaker = _tripped()
+    _cool_down(breaker)
+    assert breaker.acquire()
+    breaker.record_failure(FAILURE_SERVER_ERROR)
+    assert breaker.is_open and not breaker.acquire()
+    assert breaker.open_seconds == settings.SCRAPE_BREAKER_OPEN_SECONDS * 2
+    _cool_down(breaker)
+    assert breaker.acquire()
+
+
+@pytest.mark.parametrize("kind", [FAILURE_NOT_FOUND, FAILURE_HTTP_ERROR])
+def test_probe_answered_with_a_non_breaker_failure_closes_the_breaker(kind):
+    breaker = _tripped()
+    _cool_down(breaker)
+    assert breaker.acquire()
+    breaker.record_failure(kind)
+    assert not breaker.is_open
+    assert breaker.available() and breaker.acquire()
+
+
+def test_non_breaker_failures_do_not_count():
+    breaker = CircuitBreaker("www.amazon.in")
+    for _ in range(settings.SCRAPE_BREAKER_THRESHOLD * 2):
+        breaker.record_failure(FAILURE_NOT_FOUND)
+    assert not breaker.is_open and breaker.acquire()
@@ -0,0 +1,45 @@
+# Parity test for the scraper parser engines (scrapers/engines.py): every engine
+# has to extract exactly the same fields from the saved product pages in fixtures/.
+from pathlib import Path
+
+import pytest
+
+from scrapers.amazon import AmazonScraper
+from scrapers.engines import ENGINES, parse_document
+from scrapers.spec import PROFILE_FULL, PROFILE_LISTING
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+# Saved page -> (URL it was saved from, price the scraper should find on it)
+PAGES = {
+    "amazon_in_headphones.html": ("https://www.amazon.in/dp/B09XS7JWHH", 29990.0),
+    "amazon_in_book_unavailable.html": ("https://www.amazon.in/dp/8185986061", None),
+    "amazon_in_kettle_listing.html": ("https://www.amazon.in/dp/B01I1LDZGA", 649.0),
+}
+
+
+def _scrape_all(page: str, profile: str):
+    url, _ = PAGES[page]
+    body = (FIXTURES / page).read_bytes()
+    scraper = AmazonScraper()
+    return {
+        engine: scraper.scrape(parse_document(body, engine), url, profile).model_dump(mode="json")
+        for engine in ENGINES
+    }
+
+
+@pytest.mark.parametrize("profile", [PROFILE_FULL, PROFILE_LISTING])
+@pytest.mark.parametrize("page", sorted(PAGES))
+def test_engines_extract_identical_fields(page, profile):
+    results = _scrape_all(page, profile)
+    baseline = results.pop("html.parser")
+    for engine, result in results.items():
+        assert result == baseline, f"{engine} differs from html.parser on {page}"
+
+
+@pytest.mark.parametrize("page", sorted(PAGES))
+def test_fixture_price(page):
+    # Guards against the engines agreeing only because every selector stopped matching
+    _, price = PAGES[page]
+    for result in _scrape_all(page, PROFILE_LISTING).values():
+        assert result["price"] == price
@@ -0,0 +1,151 @@
+# Query-plan regression test: seeds a scratch Postgres database with a few million
+# rows and checks, with EXPLAIN, that the hot queries keep using the indexes and
+# partition pruning they were designed around. Runs only when TEST_DATABASE_URL
+# points at a database it may wipe, e.g.
+#
+#   TEST_DATABASE_URL=postgresql://postgres@localhost/pt_test python -m pytest tests/test_query_plans.py
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects import postgresql
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get("TEST_DATABASE_URL"), reason="TEST_DATABASE_URL is not set (needs a scratch Postgres database)"
+)
+
+USERS = 2_000
+LISTINGS = 100_000
+TRACKED_PRODUCTS = 200_000
+PRICE_RUNS = 2_000_000 # Spread over the last MONTHS months
+MONTHS = 12
+
+
+def _months_back(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 - count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+@pytest.fixture(scope="module")
+def db():
+    from alembic import command
+    from alembic.config import Config
+    from db.partitions import _next_month, partition_name
+
+    engine = create_engine(os.environ["TEST_DATABASE_URL"])
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public;"))
+    command.upgrade(Config(str(Path(__file__).parents[1] / "alembic.ini")), "head")
+
+    today = date.today()
+    this_month = date(today.year, today.month, 1)
+    with engine.begin() as conn:
+        for back in range(1, MONTHS + 1):
+            month = _months_back(this_month, back)
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF price_history "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+            ))
+        conn.execute(text(
+            "INSERT INTO users (id, email, hashed_password) "
+            "SELECT g, 'user' || g || '@example.com', 'x' FROM generate_series(1, :n) g"
+        ), {"n": USERS})
+        # A tenth of the listings were never checked; the rest are due at times spread over two days
+        conn.execute(text(
+            "INSERT INTO listings (id, url, watchers, next_check_at) "
+            "SELECT g, 'https://www.amazon.in/dp/L' || g, 2, "
+            "CASE WHEN g % 10 = 0 THEN NULL ELSE localtimestamp + (g % 2880 - 1440) * interval '1 minute' END "
+            "FROM generate_series(1, :n) g"
+        ), {"n": LISTINGS})
+        conn.execute(text(
+            "INSERT INTO tracked_products (owner_id, url, listing_id, is_active) "
+            "SELECT (g / 100) % :users + 1, 'https://www.amazon.in/dp/L' || (g % :listings + 1), g % :listings + 1, true "
+            "FROM generate_series(0, :n - 1) g"
+        ), {"users": USERS, "listings": LISTINGS, "n": TRACKED_PRODUCTS})
+        # Each listing's runs follow each other through the months
+        conn.execute(text(
+            "INSERT INTO price_history (listing_id, price, timestamp, last_seen, checks) "
+            "SELECT g % :listings + 1, 1000 + g % 97, "
+            "start + (g / :listings) * step + (g % :listings) * interval '1 second', "
+            "start + (g / :listings + 1) * step, 10 "
+            "FROM generate_series(0, :n - 1) g, "
+            "(SELECT CAST(:start AS timestamp) AS start, (localtimestamp - CAST(:start AS timestamp)) / (:n / :listings) AS step) s"
+        ), {"listings": LISTINGS, "n": PRICE_RUNS, "start": _months_back(this_month, MONTHS)})
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE"))
+    yield engine
+    engine.dispose()
+
+
+def _plan(engine, statement) -> dict:
+    sql = statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        return conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()[0]["Plan"]
+
+
+def _nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from _nodes(child)
+
+
+def _scans(plan: dict, table: str):
+    """(node type, index name, relation) of every scan of `table` (or one of its partitions)."""
+    return [
+        (node["Node Type"], node.get("Index Name"), node["Relation Name"])
+        for node in _nodes(plan)
+        if node.get("Relation Name", "").startswith(table)
+    ]
+
+
+def test_claim_uses_the_due_time_index(db):
+    import crud_operations
+
+    plan = _plan(db, crud_operations._claim_listings("test", 500, datetime.now(), 60))
+    limits = [node for node in _nodes(plan) if node["Node Type"] == "Limit"]
+    assert limits, "the claim has no LIMIT"
+    below = list(_nodes(limits[0]))
+    assert any(node.get("Index Name") == "ix_listings_watched_next_check_at" for node in below)
+    # The index supplies the due order: nothing sorts the due listings before the LIMIT
+    assert not [node for node in below if node["Node Type"] in ("Sort", "Incremental Sort")]
+
+
+def test_tracked_list_uses_the_owner_index(db):
+    import crud_operations
+
+    scans = _scans(_plan(db, crud_operations._tracked_products_for_user(42)), "tracked_products")
+    assert scans and all(index == "uq_tracked_products_owner_url" for _, index, _ in scans), scans
+
+
+@pytest.mark.parametrize("query", ["page", "downsampled"])
+def test_history_range_uses_the_listing_timestamp_index(db, query):
+    import crud_operations
+
+    end = datetime.now() - timedelta(days=30)
+    start = end - timedelta(days=60)
+    if query == "page":
+        statement = crud_operations._price_history_page(123, start, end, None, 1000)
+    else:
+        statement = crud_operations._downsampled_price_history(123, start, end, 500)
+    # The default partition is empty here, so the planner rightly reads it without an index
+    scans = [scan for scan in _scans(_plan(db, statement), "price_history") if scan[2] != "price_history_default"]
+    assert scans
+    # Partitions inherit the index as <partition>_listing_id_timestamp_idx
+    assert all(index and index.endswith("listing_id_timestamp_idx") for _, index, _ in scans), scans
+
+
+def test_history_range_prunes_partitions_after_its_end(db):
+    import crud_operations
+    from db.partitions import partition_name
+
+    # Runs are partitioned by when they started and can last for months, so only the
+    # partitions that start after the range's end can be skipped
+    end = datetime.now() - timedelta(days=150)
+    statement = crud_operations._price_history_page(123, end - timedelta(days=30), end, None, 1000)
+    scanned = {relation for _, _, relation in _scans(_plan(db, statement), "price_history")}
+    end_month = date(end.year, end.month, 1)
+    allowed = {partition_name(_months_back(end_month, back)) for back in range(MONTHS + 1)} | {"price_history_default"}
+    assert scanned and scanned <= allowed, scanned
+    assert partition_name(end_month) in scanned
@@ -0,0 +1,235 @@
+import asyncio
+import csv
+import io
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+from pydantic import HttpUrl, TypeAdapter, ValidationError
+from sqlalchemy import func
+
+from core.config import settings
+from db.session import AsyncSessionLocal
+import crud_operations_async as crud_operations
+from schemas import ErrorResponse
+from scrapers.factory import scrape_many
+from scrapers.urls import canonicalize_url
+
+# Identifies this process's leases on track_jobs rows
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Ids of jobs waiting for a worker (and the same ids as a set, so a job is queued at most
+# once), the workers, the loop that re-queues abandoned jobs and the event loop (see start_track_workers)
+_queue: Optional[asyncio.Queue] = None
+_queued: Set[int] = set()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_workers: List[asyncio.Task] = []
+_http_url = TypeAdapter(HttpUrl)
+
+
+def parse_url_csv(text: str):
+    """
+    Reads the URLs out of an uploaded CSV: the "url" column if the file has a
+    header row with one, otherwise the first column. Returns (urls, errors), where
+    errors lists the rows that don't hold a valid URL.
+    """
+    rows = [row for row in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in row)]
+    column = 0
+    if rows:
+        header = [cell.strip().lower() for cell in rows[0]]
+        if "url" in header:
+            column = header.index("url")
+            rows = rows[1:]
+    urls, errors = [], []
+    for row in rows:
+        value = row[column].strip() if column < len(row) else ""
+        try:
+            urls.append(str(_http_url.validate_python(value)))
+        except ValidationError:
+            errors.append({"url": value, "error": "Not a valid URL."})
+    return urls, errors
+
+
+class LeaseLost(Exception):
+    """Another process took the job over (this one's lease ran out while it was working on it)."""
+
+
+def _lease_until():
+    return func.localtimestamp() + timedelta(seconds=settings.TRACK_JOB_LEASE_SECONDS)
+
+
+async def _load_job(job_id: int):
+    """
+    Claims the job for this process and returns (owner_id, urls, errors rejected
+    before the job was queued, canonical URLs the owner already tracks), or None
+    when the job is finished or another process is running it.
+    """
+    async with AsyncSessionLocal() as db:
+        claimed = await crud_operations.claim_track_job(db, job_id, WORKER_ID, settings.TRACK_JOB_LEASE_SECONDS)
+        if claimed is None:
+            return None
+        owner_id, urls, errors, total = claimed
+        tracked = {canonicalize_url(url) for url in await crud_operations.get_tracked_urls_for_user(db, owner_id)}
+        # create_track_job puts the up-front rejections first; the rest are the errors of an interrupted run
+        return owner_id, urls, errors[:total - len(urls)], tracked
+
+
+async def _save_batch(job_id: int, owner_id: int, batch, progress: dict):
+    """Tracks one batch of scraped products and records the job's progress, in one transaction."""
+    async with AsyncSessionLocal() as db:
+        await crud_operations.bulk_track_products(db, owner_id, batch)
+        if not await crud_operations.update_track_job(
+            db, job_id, lease_owner=WORKER_ID, lease_expires_at=_lease_until(), **progress
+        ):
+            await db.rollback()
+            raise LeaseLost()
+        await db.commit()
+
+
+async def _update_job(job_id: int, **fields):
+    """Updates the job while this process holds it, renewing the lease unless `fields` set it."""
+    fields.setdefault("lease_expires_at", _lease_until())
+    async with AsyncSessionLocal() as db:
+        if not await crud_operations.update_track_job(db, job_id, lease_owner=WORKER_ID, **fields):
+            raise LeaseLost()
+        await db.commit()
+
+
+async def _run_job(job_id: int):
+    """
+    Scrapes every URL of a job (a bounded number at a time) and tracks the
+    results in batches, saving the job's progress with each batch and at least
+    every third of a lease, which renews the lease.
+    """
+    loaded = await _load_job(job_id)
+    if loaded is None:
+        return
+    owner_id, urls, errors, tracked = loaded
+    print(f"TRACK JOBS: Job {job_id} started ({len(urls)} URLs).")
+
+    # Progress is rebuilt from scratch, so a job interrupted by a restart can simply run again:
+    # whatever it already tracked is skipped this time, and URLs that failed are tried again
+    errors = list(errors)
+    progress = {"processed": len(errors), "succeeded": 0, "skipped": 0, "failed": len(errors), "errors": errors}
+    to_scrape = []
+    for url in urls:
+        key = canonicalize_url(url)
+        if key in tracked:
+            progress["skipped"] += 1
+            progress["processed"] += 1
+        else:
+            tracked.add(key)
+            to_scrape.append(url)
+
+    batch = []
+    renew_every = settings.TRACK_JOB_LEASE_SECONDS / 3
+    renew_at = time.monotonic() + renew_every
+
+    async def flush():
+        nonlocal renew_at
+        progress["succeeded"] += len(batch)
+        try:
+            await _save_batch(job_id, owner_id, batch, progress)
+            renew_at = time.monotonic() + renew_every
+        except LeaseLost:
+            raise
+        except Exception as e:
+            print(f"TRACK JOBS: Error saving {len(batch)} products for job {job_id}: {e}")
+            progress["succeeded"] -= len(batch)
+            progress["failed"] += len(batch)
+            errors.extend({"url": str(p.listing.url), "error": f"Could not save product: {e}"} for p in batch)
+        batch.clear()
+
+    try:
+        async for _, result in scrape_many(to_scrape, settings.TRACK_JOB_SCRAPE_CONCURRENCY):
+            progress["processed"] += 1
+            if isinstance(result, ErrorResponse):
+                progress["failed"] += 1
+                errors.append({"url": result.url, "error": result.error, "kind": result.kind})
+            else:
+                batch.append(result)
+            if len(batch) >= settings.TRACK_JOB_BATCH_SIZE:
+                await flush()
+            elif time.monotonic() >= renew_at:
+                await _update_job(job_id, **progress)
+                renew_at = time.monotonic() + renew_every
+        await flush()
+        await _update_job(job_id, status="done", finished_at=datetime.now(), lease_expires_at=None, **progress)
+    except LeaseLost:
+        print(f"TRACK JOBS: Job {job_id} was taken over by another process; stopping.")
+        return
+    except asyncio.CancelledError:
+        # Shutting down: left as running with its lease released, so whichever process looks next resumes it
+        try:
+            await asyncio.shield(_update_job(job_id, lease_expires_at=None, **progress))
+        except Exception as e:
+            print(f"TRACK JOBS: Could not release job {job_id}, it resumes once its lease runs out: {e}")
+        raise
+    except Exception as e:
+        print(f"TRACK JOBS: Job {job_id} failed: {e}")
+        await _update_job(job_id, status="failed", finished_at=datetime.now(), lease_expires_at=None, **progress)
+        return
+    print(f"TRACK JOBS: Job {job_id} finished. {progress['succeeded']} tracked, "
+          f"{progress['skipped']} already tracked, {progress['failed']} failed.")
+
+
+async def _worker():
+    while True:
+        job_id = await _queue.get()
+        _queued.discard(job_id)
+        try:
+            await _run_job(job_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"TRACK JOBS: Error running job {job_id}: {e}")
+
+
+def _put(job_id: int):
+    if job_id not in _queued:
+        _queued.add(job_id)
+        _queue.put_nowait(job_id)
+
+
+async def _requeue_abandoned():
+    """
+    Queues the jobs no process is running: left queued or running by a process
+    that stopped, or whose process died and whose lease ran out. Which process
+    runs each of them is settled by the claim in _load_job.
+    """
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                for job_id in await crud_operations.get_unfinished_track_job_ids(db):
+                    _put(job_id)
+        except Exception as e:
+            print(f"TRACK JOBS: Error looking for abandoned jobs: {e}")
+        await asyncio.sleep(settings.TRACK_JOB_LEASE_SECONDS)
+
+
+def enqueue_track_job(job_id: int):
+    """Hands a newly created job to the worker pool. Safe to call from sync endpoints' threads."""
+    _loop.call_soon_threadsafe(_put, job_id)
+
+
+async def start_track_workers():
+    """
+    Starts TRACK_JOB_WORKERS background workers, and a loop that re-queues the jobs
+    no process is running, starting with those a previous process left queued or
+    running. Call once from the app's startup; any number of replicas can run them.
+    """
+    global _queue, _loop
+    _queue = asyncio.Queue()
+    _loop = asyncio.get_running_loop()
+    _workers.extend(asyncio.create_task(_worker()) for _ in range(settings.TRACK_JOB_WORKERS))
+    _workers.append(asyncio.create_task(_requeue_abandoned()))
+
+
+async def close_track_workers():
+    """Stops the workers; jobs still in progress are released, to resume on the next start."""
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queued.clear()